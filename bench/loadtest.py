@@ -0,0 +1,51 @@
+import sys
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run(url, cookies, concurrency, total):
+    session = requests.Session()
+    session.cookies.update(cookies)
+
+    def hit(_):
+        start = time.perf_counter()
+        try:
+            status = session.get(url).status_code
+        except requests.RequestException:
+            # e.g. a keep-alive connection closed by the server, counted as an error
+            status = 0
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[1] for r in results)
+    errors = len([r for r in results if r[0] >= 400 or r[0] == 0])
+    print("Requests: %d, concurrency: %d, errors: %d" % (total, concurrency, errors))
+    print("Throughput: %.1f req/s" % (total / elapsed))
+    print("Latency p50: %.1f ms, p95: %.1f ms, max: %.1f ms" % (
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        latencies[-1] * 1000,
+    ))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] in ["-h", "--help"]:
+        print(
+            """
+        USAGE: python bench/loadtest.py [URL] [JSESSIONID] [_r] [CONCURRENCY=20] [REQUESTS=500]
+        e.g. python bench/loadtest.py http://127.0.0.1:8081/v1/vendor/all-vendors <sid> <r>
+        OUTPUT: THROUGHPUT AND LATENCY PERCENTILES OF GET REQUESTS AGAINST URL
+        """
+        )
+        sys.exit(0)
+    run(
+        sys.argv[1],
+        {"JSESSIONID": sys.argv[2], "_r": sys.argv[3]},
+        int(sys.argv[4]) if len(sys.argv) > 4 else 20,
+        int(sys.argv[5]) if len(sys.argv) > 5 else 500,
+    )
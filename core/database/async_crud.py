@@ -0,0 +1,23 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database.model import Vendor, Preset
+
+
+async def get_all_vendors(db: AsyncSession):
+    result = await db.execute(select(Vendor))
+    return result.scalars().all()
+
+
+async def get_vendor(db: AsyncSession, code: str):
+    result = await db.execute(select(Vendor).filter(Vendor.vendor_code == code))
+    return result.scalars().first()
+
+
+async def get_all_presets(db: AsyncSession, username):
+    result = await db.execute(
+        select(Preset)
+        .filter(Preset.creator == username)
+        .order_by(Preset.preset_id, Preset.record_id)
+    )
+    return result.scalars().all()
@@ -1,14 +1,61 @@
 import json
+import hashlib
+from datetime import date, datetime
 import pandas as pd
-from tqdm import tqdm
-from sqlalchemy import text, func, insert, and_, delete
+from cachetools import TTLCache
+from sqlalchemy import text, func, insert, update, and_, delete, bindparam, DateTime, String
 from sqlalchemy.orm import Session
-from fastapi.concurrency import run_in_threadpool
 
 from core import schema
-from core.database.utils import compile_query
+from core.database.utils import compile_query, ColumnResolver
 from core.database.model import Order, ExtraInfo, TrackingNote, CDLOrder, User, Vendor, Preset, SensitiveBarcode
 from core.utils.Data import flush_tags_upon_vendor_update
+from core.utils.cache import InstrumentedCache, get_version, bump_version
+from core.utils.profiling import RunProfile
+
+# ids per statement of set-based updates
+BULK_CHUNK_SIZE = 1000
+# keyed by the "cdl" data version, the TTL bounds staleness across worker processes
+CDL_STATS_CACHE = InstrumentedCache("cdl_scan_stats", TTLCache(maxsize=16, ttl=600))
+METADATA_CACHE = InstrumentedCache("metadata", TTLCache(maxsize=4, ttl=3600))
+
+ORDER_COLUMNS = ColumnResolver({
+    "ExtraInfo": ["tags", "checked", "attention"],
+    "TrackingNote": ["tracking_note"],
+    "default": "Order",
+})
+PENDING_CDL_COLUMNS = ColumnResolver({
+    "CDLOrder": [
+        "cdl_item_status",
+        "order_request_date",
+        "scanning_vendor_payment_date",
+        "pdf_delivery_date",
+        "back_to_karms_date",
+    ],
+    "ExtraInfo": ["tags", "checked", "attention"],
+    "TrackingNote": ["tracking_note"],
+    "default": "Order",
+})
+CDL_COLUMNS = ColumnResolver({
+    "ExtraInfo": ["tags", "checked", "attention"],
+    "TrackingNote": ["tracking_note"],
+    "CDLOrder": [
+        "cdl_item_status",
+        "order_request_date",
+        "scanning_vendor_payment_date",
+        "pdf_delivery_date",
+        "circ_pdf_url",
+        "back_to_karms_date",
+    ],
+    "default": "Order",
+})
+
+# derived columns kept for filtering, not part of what the views (and reports) return
+INTERNAL_COLUMNS = {"pending_due"}
+
+
+def view_columns(model):
+    return [c for c in model.__table__.c if c.name not in INTERNAL_COLUMNS]
 
 
 def login(db: Session, username, password):
@@ -50,45 +97,29 @@ def get_overdue_rush_local(
         filters = []
     args = [
         *Order.__table__.c,
-        *ExtraInfo.__table__.c,
+        *view_columns(ExtraInfo),
         TrackingNote.tracking_note,
         Vendor.notify_in,
     ]
-    query = (
-        db.query(*args)
-        .join(ExtraInfo, Order.id == ExtraInfo.id)
-        .join(Vendor, Order.vendor_code == Vendor.vendor_code, isouter=True)
-        .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
-        .filter(ExtraInfo.tags.like("%%[Rush]%%"))
-        .filter(ExtraInfo.tags.like("%%[Local]%%"))
-        # .filter(Order.arrival_date == None)
-        # .filter(Order.order_status != "VC")
-    )
-    table_mapping = {
-        "ExtraInfo": ["tags", "checked", "attention"],
-        "TrackingNote": ["tracking_note"],
-        "default": "Order",
-    }
 
-    # when should a local-rush order be checked?
-    # when user marked order as check_anyway, or the order takes longer to arrive
-    # and the order hasn't been checked yet,or the override time also has been exceeded
+    def build_query():
+        return (
+            db.query(*args)
+            .join(ExtraInfo, Order.id == ExtraInfo.id)
+            .join(Vendor, Order.vendor_code == Vendor.vendor_code, isouter=True)
+            .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
+        )
 
-    suffix = text(
-        """(extra_info.check_anyway = 1 or (
-          nyc_orders.arrival_date is null
-          and nyc_orders.order_status != 'VC' 
-          and DATEDIFF(current_timestamp(), nyc_orders.created_date) > vendors.notify_in
-          and (extra_info.checked = 0 or (extra_info.override_reminder_time is not null
-            and current_timestamp() > extra_info.override_reminder_time))))
-        """.replace("\n", " "))
+    # pending_due is only set for Rush-Local orders, see refresh_rush_local_due
+    suffix = ExtraInfo.pending_due <= func.current_timestamp()
 
     # fixed_filters = [schema.FieldFilter(op="in", col="tags", val=["Rush", "Local"])]
     # filters.extend(fixed_filters)
 
 
     query, total_records = compile_query(
-        query, filters, table_mapping, sorter, Order.id, page_index, page_size, suffix, fuzzy
+        db, "rush_local", build_query, filters, ORDER_COLUMNS, sorter, Order.id, page_index,
+        page_size, suffix, fuzzy, count=not for_pandas,
     )
 
     if for_pandas:
@@ -108,44 +139,26 @@ def get_overdue_cdl(
         **kwargs,
 ):
     args = [
-        *CDLOrder.__table__.c,
+        *view_columns(CDLOrder),
         *Order.__table__.c,
-        *ExtraInfo.__table__.c,
+        *view_columns(ExtraInfo),
         TrackingNote.tracking_note,
     ]
-    table_mapping = {
-        "CDLOrder": [
-            "cdl_item_status",
-            "order_request_date",
-            "scanning_vendor_payment_date",
-            "pdf_delivery_date",
-            "back_to_karms_date",
-        ],
-        "ExtraInfo": ["tags", "checked", "attention"],
-        "TrackingNote": ["tracking_note"],
-        "default": "Order",
-    }
-
-    avg_days = get_cdl_scan_stats(db)["avg"]
 
-    query = (
-        db.query(*args)
-        .join(Order, CDLOrder.book_id == Order.id)
-        .join(ExtraInfo, CDLOrder.book_id == ExtraInfo.id)
-        .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
-    )
+    def build_query():
+        return (
+            db.query(*args)
+            .join(Order, CDLOrder.book_id == Order.id)
+            .join(ExtraInfo, CDLOrder.book_id == ExtraInfo.id)
+            .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
+        )
 
-    # override_reminder_time != 0 implicitly indicated checked = 1
-    suffix = text(
-        """(extra_info.check_anyway = 1 or 
-        (cdl_info.pdf_delivery_date is null 
-        and datediff(current_timestamp(), cdl_info.order_request_date) > %d
-        and (extra_info.checked = 0 or (extra_info.override_reminder_time is not null
-        and CURRENT_TIMESTAMP() > extra_info.override_reminder_time))))""" % (avg_days or 0)
-    )
+    # see refresh_cdl_due
+    suffix = CDLOrder.pending_due <= func.current_timestamp()
 
     query, total_records = compile_query(
-        query, filters, table_mapping, sorter, Order.id, page_index, page_size, suffix, fuzzy,
+        db, "overdue_cdl", build_query, filters, PENDING_CDL_COLUMNS, sorter, Order.id, page_index,
+        page_size, suffix, fuzzy, count=not for_pandas,
     )
 
     if for_pandas:
@@ -167,19 +180,17 @@ def get_sh_order_report(
         filters = []
     args = [
         *Order.__table__.c,
-        *ExtraInfo.__table__.c,
+        *view_columns(ExtraInfo),
         TrackingNote.tracking_note,
     ]
-    query = (
-        db.query(*args)
-        .join(ExtraInfo, Order.id == ExtraInfo.id)
-        .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
-    )
-    table_mapping = {
-        "ExtraInfo": ["tags", "checked", "attention"],
-        "TrackingNote": ["tracking_note"],
-        "default": "Order",
-    }
+
+    def build_query():
+        return (
+            db.query(*args)
+            .join(ExtraInfo, Order.id == ExtraInfo.id)
+            .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
+        )
+
     suffix = text("""datediff(current_timestamp(), created_date) <= 1095""")
     fixed_filters = [
         schema.FieldFilter(op="like", col="sublibrary", val="NSHNG"),
@@ -189,7 +200,8 @@ def get_sh_order_report(
     filters.extend(fixed_filters)
     sorter = sorter or fixed_sorter
     query, total_records = compile_query(
-        query, filters, table_mapping, sorter, Order.id, page_index, page_size, suffix
+        db, "sh_order_report", build_query, filters, ORDER_COLUMNS, sorter, Order.id, page_index,
+        page_size, suffix, count=not for_pandas,
     )
 
     if for_pandas:
@@ -204,36 +216,42 @@ def get_all_orders(
         page_size: int = 10,
         filters=None,
         sorter=None,
+        for_pandas=False,
         fuzzy=None,
         **kwargs,
 ):
     args = [
         *Order.__table__.c,
-        *ExtraInfo.__table__.c,
+        *view_columns(ExtraInfo),
         TrackingNote.tracking_note,
         Vendor.notify_in,
     ]
-    query = (
-        db.query(*args)
-        .join(ExtraInfo, Order.id == ExtraInfo.id, isouter=True)
-        .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
-        .join(Vendor, Order.vendor_code == Vendor.vendor_code, isouter=True)
-    )
-    table_mapping = {
-        "ExtraInfo": ["tags", "checked", "attention"],
-        "TrackingNote": ["tracking_note"],
-        "default": "Order",
-    }
+
+    def build_query():
+        return (
+            db.query(*args)
+            .join(ExtraInfo, Order.id == ExtraInfo.id, isouter=True)
+            .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
+            .join(Vendor, Order.vendor_code == Vendor.vendor_code, isouter=True)
+        )
+
     query, total_records = compile_query(
-        query,
+        db,
+        "all_orders",
+        build_query,
         filters,
-        table_mapping,
+        ORDER_COLUMNS,
         sorter,
         Order.id,
         page_index,
         page_size,
         fuzzy=fuzzy,
+        count=not for_pandas,
     )
+
+    if for_pandas:
+        return query.statement
+
     return query.all(), page_index * page_size + total_records if total_records != 0 else 0
 
 
@@ -249,50 +267,59 @@ def get_order_detail(db: Session, book_id: int):
     return query
 
 
+def get_order_details(db: Session, book_ids):
+    return (
+        db.query(Order, ExtraInfo, TrackingNote, Vendor)
+        .join(ExtraInfo, Order.id == ExtraInfo.id, isouter=True)
+        .join(TrackingNote, Order.id == TrackingNote.book_id, isouter=True)
+        .join(Vendor, Order.vendor_code == Vendor.vendor_code, isouter=True)
+        .filter(Order.id.in_(book_ids))
+        .all()
+    )
+
+
 def get_all_cdl(
         db: Session,
         page_index: int = 0,
         page_size: int = 10,
         filters=None,
         sorter=None,
+        for_pandas=False,
         fuzzy=None,
         **kwargs,
 ):
     args = [
-        *CDLOrder.__table__.c,
+        *view_columns(CDLOrder),
         *Order.__table__.c,
-        *ExtraInfo.__table__.c,
+        *view_columns(ExtraInfo),
         TrackingNote.tracking_note,
     ]
-    query = (
-        db.query(*args)
-        .join(Order, CDLOrder.book_id == Order.id)
-        .join(ExtraInfo, ExtraInfo.id == Order.id, isouter=True)
-        .join(TrackingNote, TrackingNote.book_id == Order.id, isouter=True)
-    )
-    table_mapping = {
-        "ExtraInfo": ["tags", "checked", "attention"],
-        "TrackingNote": ["tracking_note"],
-        "CDLOrder": [
-            "cdl_item_status",
-            "order_request_date",
-            "scanning_vendor_payment_date",
-            "pdf_delivery_date",
-            "circ_pdf_url",
-            "back_to_karms_date",
-        ],
-        "default": "Order",
-    }
+
+    def build_query():
+        return (
+            db.query(*args)
+            .join(Order, CDLOrder.book_id == Order.id)
+            .join(ExtraInfo, ExtraInfo.id == Order.id, isouter=True)
+            .join(TrackingNote, TrackingNote.book_id == Order.id, isouter=True)
+        )
+
     query, total_records = compile_query(
-        query,
+        db,
+        "all_cdl",
+        build_query,
         filters,
-        table_mapping,
+        CDL_COLUMNS,
         sorter,
         Order.id,
         page_index,
         page_size,
         fuzzy=fuzzy,
+        count=not for_pandas,
     )
+
+    if for_pandas:
+        return query.statement
+
     return query.all(), page_index * page_size + total_records if total_records != 0 else 0
 
 
@@ -308,6 +335,17 @@ def get_cdl_detail(db: Session, book_id: int):
     return query
 
 
+def get_cdl_details(db: Session, book_ids):
+    return (
+        db.query(CDLOrder, Order, ExtraInfo, TrackingNote)
+        .join(Order, CDLOrder.book_id == Order.id)
+        .join(ExtraInfo, CDLOrder.book_id == ExtraInfo.id, isouter=True)
+        .join(TrackingNote, TrackingNote.book_id == Order.id, isouter=True)
+        .filter(CDLOrder.book_id.in_(book_ids))
+        .all()
+    )
+
+
 def new_cdl_order(db: Session, body: schema.PatchOrderRequest):
     created_date = db.query(Order.created_date).filter(Order.id == body.book_id)
     cdl = CDLOrder(book_id=body.book_id, order_request_date=created_date)
@@ -316,6 +354,8 @@ def new_cdl_order(db: Session, body: schema.PatchOrderRequest):
         {"tags": ExtraInfo.tags + "[CDL]", "cdl_flag": 1}
     )
     db.commit()
+    bump_version("data", "cdl")
+    refresh_cdl_due(db, [body.book_id])
     return schema.BasicResponse(msg="Success")
 
 
@@ -328,88 +368,181 @@ def del_cdl_order(db: Session, book_id):
     )
     db.execute(sql)
     db.commit()
+    bump_version("data", "cdl")
+    # the delivery time of the removed order may have shifted the average turnaround
+    refresh_cdl_due(db)
     return schema.BasicResponse(msg="Success")
 
 
-def update_cdl_order(db: Session, body: schema.PatchOrderRequest):
-    cdl_dict = {k: v for k, v in body.cdl.__dict__.items() if k != "tracking_note"}
-    db.query(CDLOrder).filter(CDLOrder.book_id == body.book_id).update(cdl_dict)
+def assign_columns(obj, values):
+    """
+    Set the mapped columns of ``obj`` and return the names whose value changed. Dates are
+    converted to the type the column loads as (datetime, or the ISO string for String columns)
+    first: a date never compares equal to either, so the object would always count as modified.
+    """
+    columns = obj.__table__.columns
+    changed = set()
+    for name, value in values.items():
+        if type(value) is date and isinstance(columns[name].type, DateTime):
+            value = datetime.combine(value, datetime.min.time())
+        elif type(value) is date and isinstance(columns[name].type, String):
+            value = value.isoformat()
+        if getattr(obj, name) != value:
+            changed.add(name)
+        setattr(obj, name, value)
+    return changed
+
+
+def patch_order(db: Session, body: schema.PatchOrderRequest, detail, username):
+    """
+    Apply a full-upload order PATCH (null is treated as set NULL) in a single transaction.
+    Only changed columns are written and the transaction is committed once.
+    :param detail: (order, extra_info, tracking_note, cdl) loaded by the caller, cdl may be None.
+    """
+    order, extra_info, tracking_note, cdl = detail
+    if body.sensitive != ("Sensitive" in extra_info.tags):
+        if body.sensitive is True:
+            mark_sensitive(db, order, commit=False)
+        elif body.sensitive is False:
+            cancel_sensitive(db, order, commit=False)
+
+    if body.check_anyway != extra_info.check_anyway and body.check_anyway:
+        tags = extra_info.tags
+        if not (("[Rush]" in tags and "[Local]" in tags) or ("[CDL]" in tags)):
+            raise schema.LibSenseException(
+                message="Check feature only supports Rush-Local and CDL orders"
+            )
+    assign_columns(extra_info, {
+        col: getattr(body, col)
+        for col in ["checked", "attention", "override_reminder_time", "check_anyway"]
+    })
+
+    delivery_changed = False
+    if cdl is not None:
+        changed = assign_columns(cdl, {
+            k: v for k, v in body.cdl.__dict__.items() if k != "tracking_note"
+        })
+        delivery_changed = bool(changed & {"pdf_delivery_date", "order_request_date"})
+
+    if tracking_note is not None:
+        if tracking_note.tracking_note != body.tracking_note:
+            if body.tracking_note is None:
+                db.delete(tracking_note)
+            else:
+                tracking_note.date = datetime.now()
+                tracking_note.taken_by = username
+                tracking_note.tracking_note = body.tracking_note
+    elif body.tracking_note is not None:
+        db.add(TrackingNote(
+            book_id=order.id,
+            date=datetime.now(),
+            taken_by=username,
+            tracking_note=body.tracking_note,
+        ))
+
+    info_changed = db.is_modified(extra_info)
+    cdl_changed = cdl is not None and db.is_modified(cdl)
+    db.flush()
+    if info_changed:
+        refresh_rush_local_due(db, [order.id], commit=False)
+    if cdl is not None and delivery_changed:
+        # CDL delivery dates feed the average turnaround, the due threshold of every CDL order
+        refresh_cdl_due(db, commit=False)
+    elif cdl is not None and (info_changed or cdl_changed):
+        # the turnaround is unaffected, so the cached stats are still valid
+        refresh_cdl_due(db, [order.id], commit=False, cached_stats=True)
     db.commit()
+    if cdl_changed:
+        bump_version("data", "cdl")
+    else:
+        bump_version()
     return schema.BasicResponse(msg="Success")
 
 
-def update_normal_order(db: Session, body: schema.PatchOrderRequest):
-    cols = ["checked", "attention", "override_reminder_time"]
-    info_dict = {k: v for k, v in body.__dict__.items() if k in cols}
-    if len(info_dict.keys()) > 0:
-        db.query(ExtraInfo).filter(ExtraInfo.id == body.book_id).update(info_dict)
-        db.commit()
+def tag_sensitive(db: Session, barcodes, direction: bool):
+    """
+    Add (or remove) the [Sensitive] tag on every order sharing one of the barcodes.
+    Issues one joined UPDATE per chunk. Rows already in the desired state are left untouched,
+    so the update is idempotent. The session is not synchronized, reload objects if needed.
+    """
+    barcodes = list(dict.fromkeys(barcodes))
+    tagged = ExtraInfo.tags.contains("[Sensitive]")
+    for idx in range(0, len(barcodes), BULK_CHUNK_SIZE):
+        stmt = update(ExtraInfo) \
+            .where(and_(
+                Order.id == ExtraInfo.id,
+                Order.barcode.in_(barcodes[idx: idx + BULK_CHUNK_SIZE]),
+                ~tagged if direction else tagged)) \
+            .values(tags=ExtraInfo.tags + "[Sensitive]" if direction
+                    else func.replace(ExtraInfo.tags, "[Sensitive]", "")) \
+            .execution_options(synchronize_session=False)
+        db.execute(stmt)
 
 
-def mark_sensitive(db: Session, book_id: int):
-    order = db.query(Order).filter(Order.id == book_id).first()
+def mark_sensitive(db: Session, order: Order, commit=True):
     if "-" in order.barcode:
         raise schema.LibSenseException("Barcode has not finalized yet.")
 
-    existence = db.query(SensitiveBarcode).filter(SensitiveBarcode.barcode == order.barcode).count()
-    if existence == 0:
-        stmt = insert(SensitiveBarcode).values(barcode=order.barcode).prefix_with("IGNORE")
-        db.execute(stmt)
-        db.query(ExtraInfo) \
-            .filter(and_(
-            Order.id == ExtraInfo.id,
-            Order.barcode == order.barcode,
-            ExtraInfo.tags.notlike("Sensitive")))\
-            .update({"tags": ExtraInfo.tags + "[Sensitive]"}, synchronize_session='fetch')
-    db.commit()
+    stmt = insert(SensitiveBarcode).values(barcode=order.barcode).prefix_with("IGNORE")
+    db.execute(stmt)
+    tag_sensitive(db, [order.barcode], True)
+    if commit:
+        db.commit()
+        bump_version()
 
 
-def cancel_sensitive(db: Session, book_id):
-    order = db.query(Order).filter(Order.id == book_id).first()
+def cancel_sensitive(db: Session, order: Order, commit=True):
     if "-" in order.barcode:
         raise schema.LibSenseException("Barcode has not finalized yet.")
 
-    existence = db.query(SensitiveBarcode).filter(SensitiveBarcode.barcode == order.barcode).count()
-    if existence == 0:
+    stmt = delete(SensitiveBarcode).where(SensitiveBarcode.barcode == order.barcode)
+    if db.execute(stmt).rowcount == 0:
         raise schema.LibSenseException("Barcode not in sensitive database. Please check library note.")
+    tag_sensitive(db, [order.barcode], False)
+    if commit:
+        db.commit()
+        bump_version()
 
-    stmt = delete(SensitiveBarcode).where(SensitiveBarcode.barcode == order.barcode)
-    db.execute(stmt)
-    db.query(ExtraInfo) \
-        .filter(and_(
-        Order.id == ExtraInfo.id,
-        Order.barcode == order.barcode,
-        ExtraInfo.tags.notlike("Sensitive"))) \
-        .update({"tags": ExtraInfo.tags.regexp_replace("\[Sensitive\]", "")}, synchronize_session='fetch')
+
+def bulk_update_extra_info(db: Session, book_ids, values):
+    """
+    Apply the same values to many extra_info rows with one UPDATE ... WHERE id IN (...) per chunk.
+    :return: number of matched rows and the ids without an extra_info row.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    affected = 0
+    missing = []
+    for idx in range(0, len(book_ids), BULK_CHUNK_SIZE):
+        chunk = book_ids[idx: idx + BULK_CHUNK_SIZE]
+        stmt = (
+            update(ExtraInfo)
+            .where(ExtraInfo.id.in_(chunk))
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        matched = db.execute(stmt).rowcount
+        affected += matched
+        if matched < len(chunk):
+            existing = {i for (i,) in db.query(ExtraInfo.id).filter(ExtraInfo.id.in_(chunk))}
+            missing.extend(i for i in chunk if i not in existing)
     db.commit()
+    return affected, missing
 
 
 def mark_order_attention(db: Session, book_ids, direction):
-    for book in book_ids:
-        db.query(ExtraInfo).filter(ExtraInfo.id == book).update({ExtraInfo.attention: direction})
-    db.commit()
-    return schema.BasicResponse(msg="Success")
+    affected, missing = bulk_update_extra_info(db, book_ids, {ExtraInfo.attention: direction})
+    bump_version()
+    return schema.BulkUpdateResponse(msg="Success", affected=affected, missing=missing)
 
 
 def mark_order_checked(db: Session, book_ids, direction, date):
-    for book in book_ids:
-        db.query(ExtraInfo).filter(ExtraInfo.id == book).update(
-            {
-                ExtraInfo.checked: direction,
-                ExtraInfo.override_reminder_time: date if direction is True else None,
-            }
-        )
-    db.commit()
-    return schema.BasicResponse(msg="Success")
-
-
-def check_anyway(db: Session, book_id: int, direction: bool):
-    if direction:
-        tags = db.query(ExtraInfo.tags).filter(ExtraInfo.id == book_id).first()[0]
-        if not (("[Rush]" in tags and "[Local]" in tags) or ("[CDL]" in tags)):
-            raise schema.LibSenseException(message="Check feature only supports Rush-Local and CDL orders")
-    db.query(ExtraInfo).filter(ExtraInfo.id == book_id).update({"check_anyway": direction})
-    db.commit()
+    values = {
+        ExtraInfo.checked: direction,
+        ExtraInfo.override_reminder_time: date if direction is True else None,
+    }
+    affected, missing = bulk_update_extra_info(db, book_ids, values)
+    refresh_pending_due(db, book_ids)
+    return schema.BulkUpdateResponse(msg="Success", affected=affected, missing=missing)
 
 
 def get_tracking_note(db: Session, book_id: int):
@@ -420,6 +553,7 @@ def add_tracking_note(db: Session, note: schema.TrackingNote):
     new_note = TrackingNote(**note.__dict__)
     db.add(new_note)
     db.commit()
+    bump_version()
     db.refresh(new_note)
     return schema.BasicResponse(msg="Success")
 
@@ -427,6 +561,7 @@ def add_tracking_note(db: Session, note: schema.TrackingNote):
 def update_tracking_note(db: Session, note: schema.TrackingNote):
     db.query(TrackingNote).filter(TrackingNote.book_id == note.book_id).update(note.__dict__)
     db.commit()
+    bump_version()
     return schema.BasicResponse(msg="Success")
 
 
@@ -434,6 +569,7 @@ def delete_tracking_note(db: Session, book_id: int):
     note = db.query(TrackingNote).filter(TrackingNote.book_id == book_id).first()
     db.delete(note)
     db.commit()
+    bump_version()
 
 
 def get_starting_position(db: Session, barcode: int, order_number: str):
@@ -444,22 +580,24 @@ def get_starting_position(db: Session, barcode: int, order_number: str):
 
 
 def update_sensitive(db: Session, output_file):
+    profile = RunProfile("update_sensitive")
+    profile.phase("read")
     if output_file.split(".")[-1] == "csv":
         df = pd.read_csv(output_file, dtype=str, header=None)
     else:
         df = pd.read_excel(output_file, dtype=str, header=None)
-    for _, row in tqdm(df.iterrows()):
-        stmt = insert(SensitiveBarcode).values(barcode=row.iloc[0]).prefix_with("IGNORE")
-        db.execute(stmt)
-
-        db.query(ExtraInfo) \
-            .filter(and_(
-            Order.id == ExtraInfo.id,
-            Order.barcode == row.iloc[0],
-            ExtraInfo.tags.notlike("Sensitive"))) \
-            .update({"tags": ExtraInfo.tags + "[Sensitive]"}, synchronize_session='fetch')
-
+    barcodes = list(dict.fromkeys(df.iloc[:, 0].dropna()))
+    profile.count(df.shape[0])
+    if len(barcodes) > 0:
+        profile.phase("insert", len(barcodes))
+        stmt = insert(SensitiveBarcode).prefix_with("IGNORE")
+        db.execute(stmt, [{"barcode": barcode} for barcode in barcodes])
+        profile.phase("tag", len(barcodes))
+        tag_sensitive(db, barcodes, True)
+    profile.phase("commit")
     db.commit()
+    bump_version()
+    profile.finish()
     return schema.BasicResponse(msg="Success")
 
 
@@ -483,27 +621,27 @@ def get_vendor(db: Session, code: str):
     return db.query(Vendor).filter(Vendor.vendor_code == code).first()
 
 
-async def update_vendor(db: Session, vendor: schema.Vendor):
+def update_vendor(db: Session, vendor: schema.Vendor):
     db.query(Vendor).filter(Vendor.vendor_code == vendor.vendor_code).update(vendor.__dict__)
     db.commit()
-    await run_in_threadpool(lambda: flush_tags_upon_vendor_update(db, vendor.vendor_code))
+    flush_tags_upon_vendor_update(db, vendor.vendor_code)
     return schema.BasicResponse(msg="Success")
 
 
-async def add_vendor(db: Session, vendor: schema.Vendor):
+def add_vendor(db: Session, vendor: schema.Vendor):
     new_vendor = Vendor(**vendor.__dict__)
     db.add(new_vendor)
     db.commit()
-    await run_in_threadpool(lambda: flush_tags_upon_vendor_update(db, vendor.vendor_code))
+    flush_tags_upon_vendor_update(db, vendor.vendor_code)
     db.refresh(new_vendor)
     return new_vendor
 
 
-async def delete_vendor(db: Session, vendor_code):
+def delete_vendor(db: Session, vendor_code):
     vendor = db.query(Vendor).filter(Vendor.vendor_code == vendor_code).first()
     db.delete(vendor)
     db.commit()
-    await run_in_threadpool(lambda: flush_tags_upon_vendor_update(db, vendor_code))
+    flush_tags_upon_vendor_update(db, vendor_code)
     return schema.BasicResponse(msg="Success")
 
 
@@ -511,27 +649,40 @@ def get_all_presets(db: Session, username):
     return db.query(Preset).filter(Preset.creator == username).all()
 
 
-def add_preset(db: Session, preset, preset_id=None):
-    next_preset_id = preset_id or (db.query(func.max(Preset.preset_id)).scalar() or 0) + 1
-    for preset_row in preset:
-        db.add(Preset(**preset_row, preset_id=next_preset_id))
+def next_preset_id(db: Session):
+    """
+    Allocate a preset id from the single-row preset_sequence table. LAST_INSERT_ID(expr) is
+    per connection, so concurrent saves get distinct ids without scanning the presets table.
+    """
+    db.execute(text("update preset_sequence set id = last_insert_id(id + 1)"))
+    return db.execute(text("select last_insert_id()")).scalar()
+
+
+def _insert_preset_rows(db: Session, preset, preset_id, username):
+    if len(preset) > 0:
+        rows = [{**row, "preset_id": preset_id, "creator": username} for row in preset]
+        db.execute(insert(Preset), rows)
+
 
+def add_preset(db: Session, preset, username):
+    preset_id = next_preset_id(db)
+    _insert_preset_rows(db, preset, preset_id, username)
     db.commit()
-    return next_preset_id
+    bump_version("preset:%s" % username)
+    return preset_id
 
 
 def update_preset(db: Session, preset, preset_id, username):
-    target_preset = (
-        db.query(Preset).filter(Preset.preset_id == preset_id).filter(Preset.creator == username)
-    )
-    if target_preset.count() == 0:
+    deleted = db.execute(
+        delete(Preset).where(and_(Preset.preset_id == preset_id, Preset.creator == username))
+    ).rowcount
+    if deleted == 0:
+        db.rollback()
         return -1
 
-    target_preset.delete()
-    for insert_preset in preset:
-        insert_preset["creator"] = username
-
-    add_preset(db, preset, preset_id)
+    _insert_preset_rows(db, preset, preset_id, username)
+    db.commit()
+    bump_version("preset:%s" % username)
     return preset_id
 
 
@@ -543,6 +694,7 @@ def delete_preset(db: Session, preset_id, username):
         return -1
     target_preset.delete()
     db.commit()
+    bump_version("preset:%s" % username)
     return schema.BasicResponse(msg="Success")
 
 
@@ -570,109 +722,173 @@ def get_material_type_meta(db: Session):
     return db.execute("SELECT material_type FROM nyc_orders GROUP BY material_type").all()
 
 
-def get_local_rush_pending(db: Session):
-    # when should a local-rush order be checked?
-    # when user marked order as check_anyway, or the order takes longer to arrive
-    # and the order hasn't been checked yet,or the override time also has been exceeded
+def build_metadata(db: Session):
+    metadata = schema.MetaData(
+        ips_code=[i[0] for i in get_ips_meta(db)],
+        vendors=[v[0] for v in get_vendor_meta(db)],
+        tags=[e.value for e in schema.Tags],
+        oldest_date=get_oldest_date(db),
+        material=[m[0] for m in get_material_meta(db)],
+        material_type=[mt[0] for mt in get_material_type_meta(db)],
+        cdl_tags=[i for i in schema.CDLStatus],
+        supported_report=[r for r in schema.ReportTypes],
+        physical_copy_status=[p[0] for p in get_physical_copy_meta(db)],
+    )
+    etag = '"%s"' % hashlib.sha1(metadata.json().encode()).hexdigest()
+    return metadata, etag
 
-    query = """
-        select count(o.id)
-        from nyc_orders as o join extra_info as e join vendors as v
-        on e.id = o.id and o.vendor_code = v.vendor_code
-        where e.tags like '%%[Rush]%%'
-          and e.tags like '%%[Local]%%'
-          and (e.check_anyway = 1 or (
-          arrival_date is null
-          and o.order_status != 'VC' 
-          and ((DATEDIFF(current_timestamp(), created_date) > notify_in) 
-            and (e.checked = 0 or (override_reminder_time is not null
-                    and current_timestamp() > override_reminder_time)))
-          ))
+
+def get_metadata_snapshot(db: Session):
     """
-    return db.execute(query.replace("\n", " ")).first()
+    Filter panel metadata and its ETag, built once per metadata version.
+    The "metadata" version is bumped by ingestion and vendor changes, CDL edits bump "cdl".
+    """
+    return METADATA_CACHE.get_or_build_versioned(("metadata", "cdl"), lambda: build_metadata(db))
+
 
+def rebuild_metadata_snapshot(db: Session):
+    bump_version("metadata")
+    return get_metadata_snapshot(db)
 
-def get_cdl_stats(db: Session, avg_only=False):
+
+def get_cdl_vendor_start_date():
     with open("configs/config.json") as f:
-        config = json.load(f)
-        vendor_start_date = config["cdl_config"]["vendor_start_date"]
-        if avg_only:
-            cdl = """
-                select floor(avg(datediff(arrival_date, created_date))) as avg
-                from nyc_orders join extra_info ei on nyc_orders.id = ei.id
-                where arrival_date is not null
-                and tags like '%%[CDL]%%'
-                and nyc_orders.id in (select cdl_info.book_id from cdl_info)
-                and created_date > '%s';
-            """ % vendor_start_date
-            return db.execute(cdl.replace("\n", " ")).first()["avg"]
-
-        cdl = """
-            select floor(avg(datediff(arrival_date, created_date))) as avg,
-            floor(max(datediff(arrival_date, created_date))) as max,
-            floor(min(datediff(arrival_date, created_date))) as min
-            from nyc_orders join extra_info ei on nyc_orders.id = ei.id
-            where arrival_date is not null
-            and tags like '%%[CDL]%%'
-            and nyc_orders.id in (select cdl_info.book_id from cdl_info)
-            and created_date > '%s';
-        """ % vendor_start_date
-        return db.execute(cdl.replace("\n", " ")).first()
+        return json.load(f)["cdl_config"]["vendor_start_date"]
 
 
 def get_cdl_scan_stats(db: Session):
-    with open("configs/config.json") as f:
-        config = json.load(f)
-        vendor_start_date = config["cdl_config"]["vendor_start_date"]
-        cdl_delivery = """
-            select floor(avg(datediff(pdf_delivery_date, order_request_date))) as avg,
-            floor(max(datediff(pdf_delivery_date, order_request_date))) as max,
-            floor(min(datediff(pdf_delivery_date, order_request_date))) as min
-            from cdl_info
-            where pdf_delivery_date is not null and order_request_date is not null
-            and order_request_date > '%s';
-        """ % vendor_start_date
-        return db.execute(cdl_delivery.replace("\n", "")).first()
-
-
-def get_cdl_pending(db: Session):
-    avg_days = get_cdl_scan_stats(db)["avg"]
-    cdl = """
-        select count(book_id)
-        from cdl_info inner join extra_info on cdl_info.book_id = extra_info.id
-        where (extra_info.check_anyway = 1 or (pdf_delivery_date is null 
-        and datediff(current_timestamp(), order_request_date) > %d
-        and (extra_info.checked = 0 
-            or (override_reminder_time is not null and CURRENT_TIMESTAMP() > override_reminder_time))));
-    """ % (avg_days or 0)
-    return db.execute(cdl.replace("\n", " ")).first()
-
-
-def get_average_days(db: Session):
-    rush_nyc = """
-        select floor(avg(datediff(arrival_date, created_date))) as avg,
-        floor(max(datediff(arrival_date, created_date))) as max,
-        floor(min(datediff(arrival_date, created_date))) as min
-        from nyc_orders join extra_info ei on nyc_orders.id = ei.id
-        where arrival_date is not null
-        and order_status != 'VC'
-        and tags like '%%[Rush]%%'
-        and tags like '%%[NY]%%';
+    return CDL_STATS_CACHE.get_or_build(get_version("cdl"), lambda: query_cdl_scan_stats(db))
+
+
+def query_cdl_scan_stats(db: Session):
+    cdl_delivery = """
+        select floor(avg(datediff(pdf_delivery_date, order_request_date))) as avg,
+        floor(max(datediff(pdf_delivery_date, order_request_date))) as max,
+        floor(min(datediff(pdf_delivery_date, order_request_date))) as min
+        from cdl_info
+        where pdf_delivery_date is not null and order_request_date is not null
+        and order_request_date > :start_date;
+    """
+    return db.execute(text(cdl_delivery), {"start_date": get_cdl_vendor_start_date()}).first()
+
+
+def get_overview_stats(db: Session):
     """
-    rush_local = """
-        select floor(avg(datediff(arrival_date, created_date))) as avg,
-        max(floor(datediff(arrival_date, created_date))) as max,
-        min(floor(datediff(arrival_date, created_date))) as min
-        from nyc_orders join extra_info ei on nyc_orders.id = ei.id
-        where arrival_date is not null
-        and order_status != 'VC'
-        and tags like '%%[Rush]%%'
-        and tags like '%%[Local]%%';
+    Pending counts and turnaround statistics of the dashboard, computed with conditional
+    aggregates in a single scan over nyc_orders.
     """
+    days = "datediff(o.arrival_date, o.created_date)"
+    scan_days = "datediff(c.pdf_delivery_date, c.order_request_date)"
+    conditions = {
+        "cdl": (
+            days,
+            """o.arrival_date is not null and e.tags like '%[CDL]%'
+            and c.book_id is not null and o.created_date > :start_date""",
+        ),
+        "cdl_scan": (
+            scan_days,
+            """c.pdf_delivery_date is not null and c.order_request_date is not null
+            and c.order_request_date > :start_date""",
+        ),
+        "rush_nyc": (
+            days,
+            """o.arrival_date is not null and o.order_status != 'VC'
+            and e.tags like '%[Rush]%' and e.tags like '%[NY]%'""",
+        ),
+        "rush_local": (
+            days,
+            """o.arrival_date is not null and o.order_status != 'VC'
+            and e.tags like '%[Rush]%' and e.tags like '%[Local]%'""",
+        ),
+    }
+    aggregates = [
+        "sum(e.pending_due <= current_timestamp()) as local_rush_pending",
+        "sum(c.pending_due <= current_timestamp()) as cdl_pending",
+    ]
+    for name, (value, condition) in conditions.items():
+        for agg in ["avg", "max", "min"]:
+            aggregates.append(
+                "floor(%s(case when %s then %s end)) as %s_%s" % (agg, condition, value, agg, name)
+            )
+    query = """
+        select %s
+        from nyc_orders as o
+        left join extra_info as e on o.id = e.id
+        left join cdl_info as c on o.id = c.book_id
+    """ % ",\n".join(aggregates)
+    return db.execute(text(query), {"start_date": get_cdl_vendor_start_date()}).first()
+
+
+def _refresh_due(db: Session, table, column, due, key, book_ids=None, commit=True, **params):
+    # rows whose due is unchanged are not written
+    stmt = "%s set %s = %s where not (%s <=> %s)" % (table, column, due, column, due)
+    if book_ids is None:
+        db.execute(text(stmt), params)
+    elif len(book_ids) > 0:
+        where = text(stmt + " and %s in :ids" % key).bindparams(bindparam("ids", expanding=True))
+        db.execute(where, {"ids": list(book_ids), **params})
+    if commit:
+        db.commit()
+        bump_version()
 
-    cdl_rs = get_cdl_stats(db)
-    cdl_scan_rs = get_cdl_scan_stats(db)
-    rush_nyc_rs = db.execute(rush_nyc.replace("\n", " ")).first()
-    rush_local_rs = db.execute(rush_local.replace("\n", " ")).first()
 
-    return cdl_rs, rush_nyc_rs, rush_local_rs, cdl_scan_rs
+def refresh_rush_local_due(db: Session, book_ids=None, commit=True):
+    # when should a local-rush order be checked?
+    # when user marked order as check_anyway, or the order takes longer to arrive
+    # and the order hasn't been checked yet,or the override time also has been exceeded
+    # DATEDIFF(now, created_date) > notify_in <=> now >= DATE(created_date) + notify_in + 1 days
+    # a check_anyway order keeps the past due it already has, so refreshing it is a no-op
+    table = """
+        update extra_info as e
+        join nyc_orders as o on e.id = o.id
+        left join vendors as v on o.vendor_code = v.vendor_code
+    """
+    due = """(case
+          when e.tags not like '%[Rush]%' or e.tags not like '%[Local]%' then null
+          when e.check_anyway = 1
+            then least(coalesce(e.pending_due, current_timestamp()), current_timestamp())
+          when o.arrival_date is not null or o.order_status is null or o.order_status = 'VC'
+            or o.created_date is null or v.notify_in is null then null
+          when e.checked = 0
+            then timestamp(date(o.created_date)) + interval (v.notify_in + 1) day
+          when e.override_reminder_time is not null
+            then greatest(timestamp(date(o.created_date)) + interval (v.notify_in + 1) day,
+                          e.override_reminder_time)
+          else null end)"""
+    _refresh_due(db, table, "e.pending_due", due, "e.id", book_ids, commit)
+
+
+def refresh_cdl_due(db: Session, book_ids=None, commit=True, cached_stats=None):
+    # override_reminder_time != 0 implicitly indicated checked = 1
+    table = """
+        update cdl_info as c
+        left join extra_info as e on c.book_id = e.id
+    """
+    due = """(case
+          when e.check_anyway = 1
+            then least(coalesce(c.pending_due, current_timestamp()), current_timestamp())
+          when c.pdf_delivery_date is not null or c.order_request_date is null then null
+          when e.checked = 0
+            then timestamp(date(c.order_request_date)) + interval :due_in day
+          when e.override_reminder_time is not null
+            then greatest(timestamp(date(c.order_request_date)) + interval :due_in day,
+                          e.override_reminder_time)
+          else null end)"""
+    # inside a caller's transaction the cached stats cannot see its uncommitted changes yet,
+    # callers that left the delivery dates alone pass cached_stats=True
+    if cached_stats is None:
+        cached_stats = commit
+    avg_days = (get_cdl_scan_stats(db) if cached_stats else query_cdl_scan_stats(db))["avg"]
+    due_in = int(avg_days or 0) + 1
+    _refresh_due(db, table, "c.pending_due", due, "c.book_id", book_ids, commit, due_in=due_in)
+
+
+def refresh_pending_due(db: Session, book_ids=None):
+    """
+    Recompute the materialized due timestamps behind the Rush-Local and CDL pending views.
+    An order is pending once its pending_due is in the past.
+    :param db: SQLAlchemy ORM Session
+    :param book_ids: only refresh these orders, refresh every order when None.
+    """
+    refresh_rush_local_due(db, book_ids)
+    refresh_cdl_due(db, book_ids)
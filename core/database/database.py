@@ -1,13 +1,162 @@
 import json
+import time
+import threading
+from contextlib import contextmanager
 from urllib.parse import quote
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from core.utils.metrics import instrument_engine
 
 with open("configs/config.json") as config_file:
     config = json.load(config_file)["sql_config"]
 
-SQLALCHEMY_DATABASE_URL = (f"""mysql+pymysql://{config["username"]}:%s@{config["server_addr"]}:{config["server_port"]}/{config["database"]}""" % quote(config["password"])).replace("\n", "")
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+# size the pool for the number of workers. pre-ping (on by default, as before) catches
+# connections dropped by wait_timeout or a failover; it costs a round trip per checkout and
+# can be turned off with "pre_ping": false where recycling alone is deemed enough.
+pool_config = config.get("pool", {})
+POOL_OPTIONS = {
+    "pool_size": pool_config.get("size", 5),
+    "max_overflow": pool_config.get("max_overflow", 10),
+    "pool_recycle": pool_config.get("recycle", 3600),
+    "pool_pre_ping": pool_config.get("pre_ping", True),
+    "pool_timeout": pool_config.get("timeout", 30),
+}
+# the async engine only serves the light vendor and preset reads, it gets its own small pool
+# rather than a second full-size one per worker
+ASYNC_POOL_OPTIONS = {
+    **POOL_OPTIONS,
+    "pool_size": pool_config.get("async_size", 2),
+    "max_overflow": pool_config.get("async_max_overflow", 3),
+}
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait_time, overflow=False, timeout=False):
+        with self._lock:
+            self.checkouts += 1
+            self.overflow_events += int(overflow)
+            self.timeouts += int(timeout)
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+
+# keyed by the pool_logging_name of the engine, which survives pool re-creation
+POOL_STATS = {"primary": PoolStats(), "replica": PoolStats()}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool recording checkout wait time, overflow connections and checkout timeouts.
+    """
+
+    def _do_get(self):
+        stats = POOL_STATS[self._orig_logging_name]
+        start = time.perf_counter()
+        overflow = self._overflow
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            stats.record(time.perf_counter() - start, timeout=True)
+            raise
+        stats.record(time.perf_counter() - start, overflow=self._overflow > max(overflow, 0))
+        return conn
+
+
+def instrumented_pool_stats(pool):
+    stats = POOL_STATS[pool._orig_logging_name]
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": POOL_OPTIONS["max_overflow"],
+        "checkouts": stats.checkouts,
+        "overflow_events": stats.overflow_events,
+        "timeouts": stats.timeouts,
+        "total_wait_seconds": round(stats.wait_time, 6),
+        "max_wait_seconds": round(stats.max_wait_time, 6),
+    }
+
+
+def pool_stats():
+    stats = {"primary": instrumented_pool_stats(engine.pool)}
+    if read_engine is not engine:
+        stats["replica"] = instrumented_pool_stats(read_engine.pool)
+    stats["async"] = {
+        "pool_size": async_engine.sync_engine.pool.size(),
+        "checked_out": async_engine.sync_engine.pool.checkedout(),
+    }
+    return stats
+
+
+def database_url(cfg):
+    return (
+        f"""mysql+pymysql://{cfg["username"]}:%s@{cfg["server_addr"]}:{cfg["server_port"]}"""
+        f"""/{cfg["database"]}""" % quote(cfg["password"])
+    ).replace("\n", "")
+
+
+SQLALCHEMY_DATABASE_URL = database_url(config)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_logging_name="primary",
+    **POOL_OPTIONS,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# optional read replica for heavy read-only traffic; unset fields fall back to the primary's.
+# without a replica, read sessions go to the primary.
+if config.get("replica"):
+    read_engine = create_engine(
+        database_url({**config, **config["replica"]}),
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name="replica",
+        **POOL_OPTIONS,
+    )
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+@contextmanager
+def named_lock(name, timeout=0):
+    """
+    MySQL named lock held on a dedicated primary connection, shared by every process and host
+    using the database. Yields whether the lock was acquired within ``timeout`` seconds.
+    """
+    with engine.connect() as conn:
+        params = {"name": name, "timeout": timeout}
+        acquired = conn.execute(text("select get_lock(:name, :timeout)"), params).scalar()
+        try:
+            yield acquired == 1
+        finally:
+            if acquired == 1:
+                conn.execute(text("select release_lock(:name)"), {"name": name})
+
+
+# used by async routes so that queries do not block the event loop
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("mysql+pymysql", "mysql+aiomysql", 1)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **ASYNC_POOL_OPTIONS)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# statement counts and timings per request, statements above the threshold are logged
+SLOW_QUERY_SECONDS = config.get("slow_query_ms", 500) / 1000
+for instrumented in {engine, read_engine, async_engine.sync_engine}:
+    instrument_engine(instrumented, SLOW_QUERY_SECONDS)
+
 Base = declarative_base()
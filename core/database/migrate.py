@@ -0,0 +1,76 @@
+import os
+import sys
+import subprocess
+from sqlalchemy import text
+from core.database.database import engine, config
+
+MIGRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def applied_migrations():
+    with engine.begin() as conn:
+        conn.execute(text(
+            "create table if not exists schema_migrations ("
+            "name varchar(255) not null primary key, "
+            "applied_at timestamp not null default current_timestamp)"
+        ))
+        return {row[0] for row in conn.execute(text("select name from schema_migrations"))}
+
+
+def pending_migrations():
+    applied = applied_migrations()
+    return [name for name in sorted(os.listdir(MIGRATION_DIR))
+            if name.endswith(".sql") and name not in applied]
+
+
+def apply_migration(name):
+    """
+    Run one migration file through the mysql client, which handles the multi-statement files
+    (triggers included) as written. The client stops at the first failing statement.
+    """
+    env = {**os.environ, "MYSQL_PWD": config["password"]}
+    args = [
+        "mysql", "-h", config["server_addr"], "-P", str(config["server_port"]),
+        "-u", config["username"], config["database"],
+    ]
+    with open(os.path.join(MIGRATION_DIR, name), "rb") as f:
+        proc = subprocess.run(args, stdin=f, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError("mysql exited with %d while applying %s" % (proc.returncode, name))
+
+
+def mark_applied(name):
+    with engine.begin() as conn:
+        conn.execute(text("insert into schema_migrations (name) values (:name)"), {"name": name})
+
+
+def migrate(fake=()):
+    """
+    Apply the pending migrations. Names in ``fake`` are only recorded, for files that were
+    already applied by hand.
+    """
+    pending = pending_migrations()
+    if not pending:
+        print("Database schema is up to date")
+    for name in pending:
+        if name in fake:
+            print("Marking %s as applied" % name)
+        else:
+            print("Applying %s" % name)
+            apply_migration(name)
+        mark_applied(name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ["-h", "--help"]:
+        print(
+            """
+        USAGE: python -m core.database.migrate [--fake NAME ...]
+        e.g. python -m core.database.migrate --fake 001_pending_due.sql
+        OUTPUT: PENDING FILES IN core/database/migrations APPLIED IN NAME ORDER TO THE DATABASE IN
+                configs/config.json, AND RECORDED IN THE schema_migrations TABLE.
+                FILES LISTED AFTER --fake ARE ONLY RECORDED, FOR ONES ALREADY APPLIED BY HAND.
+        """
+        )
+        sys.exit(0)
+    migrate(fake=sys.argv[2:] if sys.argv[1:2] == ["--fake"] else ())
@@ -0,0 +1,7 @@
+-- Materialized pending-due timestamps for the Rush-Local and CDL reminder views.
+-- Values are populated on application startup and maintained by core.database.crud.
+ALTER TABLE extra_info ADD COLUMN pending_due DATETIME NULL;
+CREATE INDEX ix_extra_info_pending_due ON extra_info (pending_due);
+
+ALTER TABLE cdl_info ADD COLUMN pending_due DATETIME NULL;
+CREATE INDEX ix_cdl_info_pending_due ON cdl_info (pending_due);
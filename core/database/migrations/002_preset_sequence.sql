@@ -0,0 +1,3 @@
+-- Single-row id sequence for presets, allocated with LAST_INSERT_ID() by core.database.crud.
+CREATE TABLE preset_sequence (id INT NOT NULL);
+INSERT INTO preset_sequence (id) SELECT COALESCE(MAX(preset_id), 0) FROM presets;
@@ -0,0 +1,157 @@
+-- Change log for incremental backups, see core.utils.backup.run_incremental_backup.
+-- Every insert, update and delete records the primary key of the touched row; the backup
+-- exports the current image of each logged row (or a tombstone) and prunes the log.
+-- Updates are only logged when a tracked column actually changes, so full-table rewrites
+-- (tag flush, ingestion) do not log untouched rows. pending_due is derived (see
+-- core.database.crud.refresh_pending_due) and not tracked, the restore tool recomputes it.
+CREATE TABLE change_log (
+    seq BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    row_key VARCHAR(255) NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER nyc_orders_ai AFTER INSERT ON `nyc_orders` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('nyc_orders', NEW.`id`);
+CREATE TRIGGER nyc_orders_au AFTER UPDATE ON `nyc_orders` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'nyc_orders', NEW.`id` FROM DUAL
+    WHERE NOT (
+        OLD.`id` <=> NEW.`id`
+        AND OLD.`bsn` <=> NEW.`bsn`
+        AND OLD.`title` <=> NEW.`title`
+        AND OLD.`arrival_text` <=> NEW.`arrival_text`
+        AND OLD.`arrival_date` <=> NEW.`arrival_date`
+        AND OLD.`arrival_operator` <=> NEW.`arrival_operator`
+        AND OLD.`items_created` <=> NEW.`items_created`
+        AND OLD.`barcode` <=> NEW.`barcode`
+        AND OLD.`ips_code` <=> NEW.`ips_code`
+        AND OLD.`ips` <=> NEW.`ips`
+        AND OLD.`item_status` <=> NEW.`item_status`
+        AND OLD.`material` <=> NEW.`material`
+        AND OLD.`collection` <=> NEW.`collection`
+        AND OLD.`ips_date` <=> NEW.`ips_date`
+        AND OLD.`ips_update_date` <=> NEW.`ips_update_date`
+        AND OLD.`ips_code_operator` <=> NEW.`ips_code_operator`
+        AND OLD.`update_date` <=> NEW.`update_date`
+        AND OLD.`created_date` <=> NEW.`created_date`
+        AND OLD.`sublibrary` <=> NEW.`sublibrary`
+        AND OLD.`order_status` <=> NEW.`order_status`
+        AND OLD.`invoice_status` <=> NEW.`invoice_status`
+        AND OLD.`material_type` <=> NEW.`material_type`
+        AND OLD.`order_number` <=> NEW.`order_number`
+        AND OLD.`order_type` <=> NEW.`order_type`
+        AND OLD.`total_price` <=> NEW.`total_price`
+        AND OLD.`order_unit` <=> NEW.`order_unit`
+        AND OLD.`arrival_status` <=> NEW.`arrival_status`
+        AND OLD.`order_status_update_date` <=> NEW.`order_status_update_date`
+        AND OLD.`vendor_code` <=> NEW.`vendor_code`
+        AND OLD.`library_note` <=> NEW.`library_note`
+    );
+CREATE TRIGGER nyc_orders_ad AFTER DELETE ON `nyc_orders` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('nyc_orders', OLD.`id`);
+
+CREATE TRIGGER extra_info_ai AFTER INSERT ON `extra_info` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('extra_info', NEW.`id`);
+CREATE TRIGGER extra_info_au AFTER UPDATE ON `extra_info` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'extra_info', NEW.`id` FROM DUAL
+    WHERE NOT (
+        OLD.`id` <=> NEW.`id`
+        AND OLD.`order_number` <=> NEW.`order_number`
+        AND OLD.`tags` <=> NEW.`tags`
+        AND OLD.`reminder_receiver` <=> NEW.`reminder_receiver`
+        AND OLD.`cdl_flag` <=> NEW.`cdl_flag`
+        AND OLD.`checked` <=> NEW.`checked`
+        AND OLD.`check_anyway` <=> NEW.`check_anyway`
+        AND OLD.`override_reminder_time` <=> NEW.`override_reminder_time`
+        AND OLD.`attention` <=> NEW.`attention`
+    );
+CREATE TRIGGER extra_info_ad AFTER DELETE ON `extra_info` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('extra_info', OLD.`id`);
+
+CREATE TRIGGER cdl_info_ai AFTER INSERT ON `cdl_info` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('cdl_info', NEW.`book_id`);
+CREATE TRIGGER cdl_info_au AFTER UPDATE ON `cdl_info` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'cdl_info', NEW.`book_id` FROM DUAL
+    WHERE NOT (
+        OLD.`book_id` <=> NEW.`book_id`
+        AND OLD.`cdl_item_status` <=> NEW.`cdl_item_status`
+        AND OLD.`order_request_date` <=> NEW.`order_request_date`
+        AND OLD.`due_date` <=> NEW.`due_date`
+        AND OLD.`physical_copy_status` <=> NEW.`physical_copy_status`
+        AND OLD.`scanning_vendor_payment_date` <=> NEW.`scanning_vendor_payment_date`
+        AND OLD.`pdf_delivery_date` <=> NEW.`pdf_delivery_date`
+        AND OLD.`back_to_karms_date` <=> NEW.`back_to_karms_date`
+        AND OLD.`bobcat_permanent_link` <=> NEW.`bobcat_permanent_link`
+        AND OLD.`circ_pdf_url` <=> NEW.`circ_pdf_url`
+        AND OLD.`vendor_file_url` <=> NEW.`vendor_file_url`
+        AND OLD.`file_password` <=> NEW.`file_password`
+        AND OLD.`author` <=> NEW.`author`
+        AND OLD.`pages` <=> NEW.`pages`
+    );
+CREATE TRIGGER cdl_info_ad AFTER DELETE ON `cdl_info` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('cdl_info', OLD.`book_id`);
+
+CREATE TRIGGER notes_ai AFTER INSERT ON `notes` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('notes', NEW.`note_id`);
+CREATE TRIGGER notes_au AFTER UPDATE ON `notes` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'notes', NEW.`note_id` FROM DUAL
+    WHERE NOT (
+        OLD.`note_id` <=> NEW.`note_id`
+        AND OLD.`book_id` <=> NEW.`book_id`
+        AND OLD.`tracking_note` <=> NEW.`tracking_note`
+        AND OLD.`taken_by` <=> NEW.`taken_by`
+        AND OLD.`date` <=> NEW.`date`
+    );
+CREATE TRIGGER notes_ad AFTER DELETE ON `notes` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('notes', OLD.`note_id`);
+
+CREATE TRIGGER vendors_ai AFTER INSERT ON `vendors` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('vendors', NEW.`vendor_code`);
+CREATE TRIGGER vendors_au AFTER UPDATE ON `vendors` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'vendors', NEW.`vendor_code` FROM DUAL
+    WHERE NOT (
+        OLD.`vendor_code` <=> NEW.`vendor_code`
+        AND OLD.`notify_in` <=> NEW.`notify_in`
+        AND OLD.`local` <=> NEW.`local`
+    );
+CREATE TRIGGER vendors_ad AFTER DELETE ON `vendors` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('vendors', OLD.`vendor_code`);
+
+CREATE TRIGGER presets_ai AFTER INSERT ON `presets` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('presets', NEW.`record_id`);
+CREATE TRIGGER presets_au AFTER UPDATE ON `presets` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'presets', NEW.`record_id` FROM DUAL
+    WHERE NOT (
+        OLD.`record_id` <=> NEW.`record_id`
+        AND OLD.`preset_id` <=> NEW.`preset_id`
+        AND OLD.`preset_name` <=> NEW.`preset_name`
+        AND OLD.`creator` <=> NEW.`creator`
+        AND OLD.`type` <=> NEW.`type`
+        AND OLD.`col` <=> NEW.`col`
+        AND OLD.`val` <=> NEW.`val`
+        AND OLD.`op` <=> NEW.`op`
+    );
+CREATE TRIGGER presets_ad AFTER DELETE ON `presets` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('presets', OLD.`record_id`);
+
+CREATE TRIGGER sensitive_barcode_ai AFTER INSERT ON `sensitive_barcode` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('sensitive_barcode', NEW.`barcode`);
+CREATE TRIGGER sensitive_barcode_au AFTER UPDATE ON `sensitive_barcode` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'sensitive_barcode', NEW.`barcode` FROM DUAL
+    WHERE NOT (
+        OLD.`barcode` <=> NEW.`barcode`
+    );
+CREATE TRIGGER sensitive_barcode_ad AFTER DELETE ON `sensitive_barcode` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('sensitive_barcode', OLD.`barcode`);
+
+CREATE TRIGGER user_ai AFTER INSERT ON `user` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('user', NEW.`username`);
+CREATE TRIGGER user_au AFTER UPDATE ON `user` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) SELECT 'user', NEW.`username` FROM DUAL
+    WHERE NOT (
+        OLD.`username` <=> NEW.`username`
+        AND OLD.`password` <=> NEW.`password`
+        AND OLD.`role` <=> NEW.`role`
+    );
+CREATE TRIGGER user_ad AFTER DELETE ON `user` FOR EACH ROW
+    INSERT INTO change_log (table_name, row_key) VALUES ('user', OLD.`username`);
@@ -55,6 +55,8 @@ class CDLOrder(Base):
     file_password = Column(String)
     author = Column(String)
     pages = Column(String)
+    # materialized by crud.refresh_cdl_due, pending once in the past
+    pending_due = Column(DateTime, index=True)
 
 
 class TrackingNote(Base):
@@ -86,6 +88,8 @@ class ExtraInfo(Base):
     check_anyway = Column(Boolean)
     override_reminder_time = Column(DateTime)
     attention = Column(Boolean)
+    # Rush-Local only, materialized by crud.refresh_rush_local_due, pending once in the past
+    pending_due = Column(DateTime, index=True)
 
 
 class User(Base):
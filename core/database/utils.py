@@ -1,43 +1,116 @@
-from humps import decamelize
-from sqlalchemy import and_, or_
+from cachetools import LRUCache
+from humps import camelize, decamelize
+from sqlalchemy import and_, or_, bindparam
 
 from core import schema
 from core.database.database import Base
 from core.database.model import MAPPING, Order
+from core.utils.cache import InstrumentedCache
 
 FUZZY_COLS = [Order.barcode, Order.bsn, Order.library_note, Order.title, Order.order_number]
 
+# compiled (filtered + sorted) queries keyed by view and request shape
+STATEMENT_CACHE = InstrumentedCache("statement", LRUCache(maxsize=256))
 
-def compile_filters(query, filters, table_mapping):
-    sql_filters = []
-    for f in filters:
-        target_table = None
+
+def normalize_filters(filters, resolver):
+    """
+    Split filters into a hashable shape (column, operator, arity) and the values to bind.
+    Requests sharing the same shape share one compiled statement.
+    """
+    shape = []
+    params = {}
+    for idx, f in enumerate(filters or []):
+        name = "f%d" % idx
+        col = resolver.key(f.col)
+        if f.op == schema.FilterOperators.IN:
+            if col == "tags":
+                shape.append((col, f.op, len(f.val)))
+                for t_idx, t in enumerate(f.val):
+                    params["%s_%d" % (name, t_idx)] = "%[" + t + "]%"
+            else:
+                shape.append((col, f.op, None in f.val))
+                params[name] = [v for v in f.val if v is not None]
+        elif f.op == schema.FilterOperators.LIKE:
+            shape.append((col, f.op, f.val is None))
+            if f.val is not None:
+                params[name] = "%" + f.val + "%"
+        elif f.op == schema.FilterOperators.BETWEEN:
+            shape.append((col, f.op, 2))
+            params[name + "_0"], params[name + "_1"] = f.val
+        else:
+            shape.append((col, f.op, None))
+    return tuple(shape), params
+
+
+class ColumnResolver:
+    """
+    Column lookup of a view, precomputed once from its table mapping.
+    Both camelCase and snake_case column names resolve to the same model attribute.
+    """
+
+    def __init__(self, table_mapping):
+        self.columns = {}
+        default_table = MAPPING[table_mapping["default"]]
+        for col in default_table.__table__.c:
+            self._register(default_table, col.key)
         for table_name, columns in table_mapping.items():
-            if decamelize(f.col) in columns:
-                target_table = MAPPING[table_name]
-        target_table = MAPPING[table_mapping["default"]] if target_table is None else target_table
+            if table_name == "default":
+                continue
+            for col in columns:
+                self._register(MAPPING[table_name], col)
+
+    def _register(self, table, col):
+        entry = (col, getattr(table, col))
+        self.columns[col] = entry
+        self.columns[camelize(col)] = entry
+
+    def key(self, col):
+        return self._lookup(col)[0]
+
+    def resolve(self, col):
+        return self._lookup(col)[1]
+
+    def _lookup(self, col):
+        entry = self.columns.get(col) or self.columns.get(decamelize(col))
+        if entry is None:
+            raise schema.LibSenseException("Unknown column: %s" % col)
+        return entry
+
+    def validate(self, filters=None, sorter=None):
+        for f in filters or []:
+            self._lookup(f.col)
+        if sorter:
+            self._lookup(sorter.col)
+
+
+def compile_filters(query, filters, resolver):
+    sql_filters = []
+    for idx, f in enumerate(filters):
+        name = "f%d" % idx
+        col = resolver.resolve(f.col)
         if f.op == schema.FilterOperators.IN:
-            if f.col == "tags":
+            if resolver.key(f.col) == "tags":
                 and_flags = []
-                for t in f.val:
-                    and_flags.append(target_table.tags.like("%[" + t + "]%"))
+                for t_idx in range(len(f.val)):
+                    and_flags.append(col.like(bindparam("%s_%d" % (name, t_idx))))
                 sql_filters.append(and_(*and_flags))
             else:
-                in_filters = [getattr(target_table, decamelize(f.col)).in_(f.val)]
+                in_filters = [col.in_(bindparam(name, expanding=True))]
                 if None in f.val:
-                    in_filters.append((getattr(target_table, decamelize(f.col)) == None))
+                    in_filters.append((col == None))
                     sql_filters.append(or_(*in_filters))
                 else:
                     sql_filters.append(*in_filters)
 
         elif f.op == schema.FilterOperators.LIKE:
             if f.val is None:
-                sql_filters.append(getattr(target_table, decamelize(f.col)) == None)
+                sql_filters.append(col == None)
             else:
-                sql_filters.append(getattr(target_table, decamelize(f.col)).like("%" + f.val + "%"))
+                sql_filters.append(col.like(bindparam(name)))
 
         elif f.op == schema.FilterOperators.BETWEEN:
-            sql_filters.append(getattr(target_table, decamelize(f.col)).between(*f.val))
+            sql_filters.append(col.between(bindparam(name + "_0"), bindparam(name + "_1")))
 
     for f in sql_filters:
         query = query.filter(f)
@@ -45,13 +118,8 @@ def compile_filters(query, filters, table_mapping):
     return query
 
 
-def compile_sorters(query, sorter, table_mapping, backup_sort_key=None):
-    target_table = None
-    for table_name, columns in table_mapping.items():
-        if decamelize(sorter.col) in columns:
-            target_table = MAPPING[table_name]
-    target_table = MAPPING[table_mapping["default"]] if target_table is None else target_table
-    col = getattr(target_table, decamelize(sorter.col))
+def compile_sorters(query, sorter, resolver, backup_sort_key=None):
+    col = resolver.resolve(sorter.col)
     if sorter.desc:
         col = col.desc()
         if backup_sort_key:
@@ -60,18 +128,20 @@ def compile_sorters(query, sorter, table_mapping, backup_sort_key=None):
     return query.order_by(col, backup_sort_key)
 
 
-def compile_fuzzy(query, fuzzy, fuzzy_cols):
+def compile_fuzzy(query, fuzzy_cols):
     fuzzy_filters = []
     for col in fuzzy_cols:
-        fuzzy_filters.append(col.like("%" + fuzzy + "%"))
+        fuzzy_filters.append(col.like(bindparam("fuzzy")))
     query = query.filter(or_(*fuzzy_filters))
     return query
 
 
 def compile_query(
-    query,
+    db,
+    view,
+    build_query,
     filters=None,
-    table_mapping=None,
+    resolver=None,
     sorter=None,
     default_key=None,
     start_idx=None,
@@ -79,20 +149,52 @@ def compile_query(
     suffix=None,
     fuzzy=None,
     fuzzy_cols=None,
+    params=None,
+    count=True,
 ):
+    """
+    Build the query of a view, reusing the compiled statement of previous requests with the
+    same shape. Request values (filters, fuzzy keyword, and the extra ``params`` referenced by
+    ``suffix``) are only bound at execution time.
+    :param db: SQLAlchemy ORM Session
+    :param view: name of the view, part of the cache key
+    :param build_query: callable returning the base query of the view, invoked on cache miss
+    :param resolver: ColumnResolver of the view; unknown columns raise LibSenseException
+    :param count: set to False when the total is not needed, e.g. for exports
+    :return: the paged query and the number of records starting from the page offset
+        (None if not counted).
+    """
     if fuzzy_cols is None:
         fuzzy_cols = FUZZY_COLS
-    if filters and table_mapping:
-        query = compile_filters(query, filters, table_mapping)
-    if fuzzy and fuzzy_cols:
-        query = compile_fuzzy(query, fuzzy, fuzzy_cols)
-    if sorter and table_mapping:
-        query = compile_sorters(query, sorter, table_mapping, default_key)
-    if suffix is not None:
-        query = query.filter(suffix)
+    if resolver:
+        resolver.validate(filters, sorter)
+    filter_shape, bound = normalize_filters(filters if resolver else None, resolver)
+    use_fuzzy = bool(fuzzy and fuzzy_cols)
+    sorter_shape = (resolver.key(sorter.col), sorter.desc) if sorter and resolver else None
+    key = (view, filter_shape, use_fuzzy, sorter_shape)
+
+    def build():
+        query = build_query()
+        if filters and resolver:
+            query = compile_filters(query, filters, resolver)
+        if use_fuzzy:
+            query = compile_fuzzy(query, fuzzy_cols)
+        if sorter and resolver:
+            query = compile_sorters(query, sorter, resolver, default_key)
+        if suffix is not None:
+            query = query.filter(suffix)
+        # detach from the session which built it, every request re-binds its own session
+        return query.with_session(None)
+
+    query = STATEMENT_CACHE.get_or_build(key, build).with_session(db)
+    if use_fuzzy:
+        bound["fuzzy"] = "%" + fuzzy + "%"
+    bound.update(params or {})
+    if bound:
+        query = query.params(**bound)
     if start_idx:
         query = query.offset(start_idx * limit)
-    total_records = query.count()
+    total_records = query.count() if count else None
     if limit and limit != -1:
         query = query.limit(limit)
     return query, total_records
@@ -1,6 +1,8 @@
 import os
 import json
+import threading
 from datetime import date
+from functools import lru_cache
 
 # for encoding/decoding messages in base64
 from base64 import urlsafe_b64encode
@@ -29,6 +31,9 @@ SCOPES = [
     "https://mail.google.com/",
     "https://www.googleapis.com/auth/drive"
 ]
+# resumable uploads, the chunk size must be a multiple of 256 KB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_RETRIES = 5
 LOGGEDIN = "LOGGEDIN"
 LOGGEDOFF = "LOGGEDOFF"
 
@@ -55,27 +60,33 @@ Generated Date: %s
 """
 
 
-class LibSenseGSuite:
-    def __init__(self):
-        self.status = LOGGEDOFF
-        try:
-            with open("configs/config.json", "r") as cfg:
-                cfg_json = json.load(cfg)
-                self._email = cfg_json["email_config"]["email"]
-                self._password = cfg_json["email_config"]["password"]
-        except (FileNotFoundError, KeyError):
-            raise BaseException("Please check the config file.")
+_credentials = None
+_credentials_lock = threading.Lock()
+# service objects wrap an httplib2.Http, which is not thread-safe, so they are cached per thread
+_services = threading.local()
 
-        self.date = date.today().strftime("%Y-%m-%d")
-        self.creds = None
-        self.instance = None
 
-    def authenticate(self):
-        creds = None
+@lru_cache(maxsize=1)
+def load_email_config():
+    try:
+        with open("configs/config.json", "r") as cfg:
+            cfg_json = json.load(cfg)
+            return cfg_json["email_config"]["email"], cfg_json["email_config"]["password"]
+    except (FileNotFoundError, KeyError):
+        raise BaseException("Please check the config file.")
+
+
+def get_credentials():
+    """
+    Process-wide credentials, loaded from token.json once and refreshed when expired.
+    """
+    global _credentials
+    with _credentials_lock:
+        creds = _credentials
         # The file token.json stores the user's access and refresh tokens, and is
         # created automatically when the authorization flow completes for the first
         # time.
-        if os.path.exists("configs/token.json"):
+        if creds is None and os.path.exists("configs/token.json"):
             creds = Credentials.from_authorized_user_file("configs/token.json", SCOPES)
         # If there are no (valid) credentials available, let the user log in.
         if not creds or not creds.valid:
@@ -87,22 +98,43 @@ class LibSenseGSuite:
             # Save the credentials for the next run
             with open("configs/token.json", "w") as token:
                 token.write(creds.to_json())
-        self.creds = creds
+        _credentials = creds
+        return creds
+
+
+def get_service(name, version):
+    """
+    Reusable API client built from the discovery document bundled with google-api-python-client,
+    so building it costs no request. Requests refresh the shared credentials when they expire.
+    """
+    services = _services.__dict__
+    if (name, version) not in services:
+        services[(name, version)] = build(
+            name,
+            version,
+            credentials=get_credentials(),
+            static_discovery=True,
+            cache_discovery=False,
+        )
+    return services[(name, version)]
+
+
+class LibSenseGSuite:
+    def __init__(self):
+        self.status = LOGGEDOFF
+        self._email, self._password = load_email_config()
+        self.date = date.today().strftime("%Y-%m-%d")
+        self.creds = None
+        self.instance = None
+
+    def authenticate(self):
+        self.creds = get_credentials()
         return True
 
     def initialize_mail(self):
         self.authenticate()
         try:
-            # Call the Gmail API
-            service = build("gmail", "v1", credentials=self.creds)
-            results = service.users().labels().list(userId="me").execute()
-            labels = results.get("labels", [])
-
-            if not labels:
-                print("No labels found.")
-                return
-
-            self.instance = service
+            self.instance = get_service("gmail", "v1")
 
         except HttpError as error:
             # TODO(developer) - Handle errors from gsuite API.
@@ -113,8 +145,7 @@ class LibSenseGSuite:
         self.authenticate()
         try:
             # create drive api client
-            service = build('drive', 'v3', credentials=self.creds)
-            self.instance = service
+            self.instance = get_service("drive", "v3")
 
         except HttpError as error:
             print(F'An error occurred when getting the GDrive instance: {error}')
@@ -165,13 +196,21 @@ class LibSenseGSuite:
     def flush_date(self):
         self.date = date.today().strftime("%Y-%m-%d")
 
-    def upload_file(self, filename, filepath):
+    def upload_file(self, filename, filepath, mimetype=None, chunk_size=UPLOAD_CHUNK_SIZE):
         try:
             # create drive api client
             file_metadata = {'name': filename, "parents": [GDRIVE_FOLDER_ID]}
-            media = MediaFileUpload(filepath)
+            # resumable upload in chunks, a failed chunk is retried from the last acknowledged byte
+            media = MediaFileUpload(
+                filepath, mimetype=mimetype, chunksize=chunk_size, resumable=True
+            )
             # pylint: disable=maybe-no-member
-            file = self.instance.files().create(body=file_metadata, media_body=media, fields='id').execute()
+            request = self.instance.files().create(
+                body=file_metadata, media_body=media, fields='id'
+            )
+            file = None
+            while file is None:
+                _, file = request.next_chunk(num_retries=UPLOAD_RETRIES)
             print(F'File ID: {file.get("id")}')
 
         except HttpError as error:
@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from enum import Enum
-from typing import List, Union, Optional
+from typing import Dict, List, Union, Optional
 from pydantic import BaseModel, conlist
 from humps import camelize
 
@@ -68,6 +68,11 @@ class ReportTypes(str, Enum):
     SHANGHAI_ORDER = "ShanghaiOrder"
 
 
+class ExportFormats(str, Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
+
+
 class EnumRole(str, Enum):
     SYS_ADMIN = "System Admin"
     USER = "User"
@@ -82,10 +87,29 @@ class BasicResponse(CamelModel):
     msg: Optional[str] = "Success"
 
 
+class BulkUpdateResponse(BasicResponse):
+    affected: int = 0
+    # requested ids without an extra_info row
+    missing: List[int] = []
+
+
 class PresetResponse(BasicResponse):
     preset_id: int
 
 
+class JobResponse(BasicResponse):
+    job_id: str
+
+
+class JobStatus(CamelModel):
+    job_id: str
+    status: str
+    attempts: int
+    error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+
 class FieldFilter(CamelModel):
     op: FilterOperators
     col: str
@@ -280,6 +304,15 @@ class NewCDLRequest(CamelModel):
     book_id: int
 
 
+class DetailRequest(CamelModel):
+    book_id: int
+    cdl: Optional[bool] = False
+
+
+class BatchDetailRequest(CamelModel):
+    orders: conlist(DetailRequest, min_items=1, max_items=500)
+
+
 class PatchOrderRequest(CamelModel):
     book_id: int
     tracking_note: Optional[str]
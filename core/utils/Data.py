@@ -1,7 +1,6 @@
 import re
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
 from datetime import date, datetime
 from sqlalchemy.sql import text
 from sqlalchemy.orm import Session
@@ -9,6 +8,8 @@ from loguru import logger
 from core.database import crud
 from core.schema import Tags, CDLStatus, PhysicalCopyStatus
 from core.database.model import Order
+from core.utils.cache import bump_version
+from core.utils.profiling import RunProfile
 
 pd.options.mode.chained_assignment = None
 
@@ -141,7 +142,9 @@ def clean_data(df):
 
 def data_ingestion(db: Session, path: str = "utils/IDX_OUTPUT_NEW_REPORT.xlsx"):
     logger.info("DATA INGESTION STARTED")
-    cnx = db.get_bind()
+    profile = RunProfile("data_ingestion")
+    profile.phase("read")
+    cnx = db.connection()
     prev = pd.read_sql_table("nyc_orders", cnx)
     prev = prev.astype(str)
     path_lst = path.split(".")
@@ -149,7 +152,9 @@ def data_ingestion(db: Session, path: str = "utils/IDX_OUTPUT_NEW_REPORT.xlsx"):
         curr = pd.read_excel(path, dtype=str)
     elif path_lst[-1] == "csv":
         curr = pd.read_csv(path, dtype=str)
+    profile.count(prev.shape[0] + curr.shape[0])
 
+    profile.phase("clean", curr.shape[0])
     curr = clean_data(curr)
 
     prev = prev[prev["order_number"].str.contains("NYUSH")]
@@ -157,6 +162,7 @@ def data_ingestion(db: Session, path: str = "utils/IDX_OUTPUT_NEW_REPORT.xlsx"):
     prev["order_number"] = prev["order_number"].apply(lambda x: x[5:])
     curr["Z68_ORDER_NUMBER"] = curr["Z68_ORDER_NUMBER"].apply(lambda x: x[5:])
 
+    profile.phase("sort", prev.shape[0] + curr.shape[0])
     current_year = int(date.today().isoformat()[0:4])
     year_dict = {i: None for i in range(current_year - 3, current_year + 1)}
     for year in year_dict.keys():
@@ -196,6 +202,7 @@ def data_ingestion(db: Session, path: str = "utils/IDX_OUTPUT_NEW_REPORT.xlsx"):
     sorted_curr = pd.concat(list(year_dict.values()))
     sorted_curr.reset_index(inplace=True, drop=True)
 
+    profile.phase("reconcile")
     prev_start = sorted_prev[sorted_prev["order_number"] == sorted_curr.iloc[0]["Z68_ORDER_NUMBER"]]
     start_idx = prev_start.iloc[0].name
 
@@ -256,10 +263,12 @@ def data_ingestion(db: Session, path: str = "utils/IDX_OUTPUT_NEW_REPORT.xlsx"):
 
     check_curr = prepare_for_db(check_curr)
     to_insert = prepare_for_db(to_insert)
+    profile.count(check_prev.shape[0])
 
     logger.info("TO_DEL: %s, TO_INSERT: %s" % (str(to_del.shape), str(to_insert.shape)))
 
-    for idx, row in tqdm(check_curr.iterrows()):
+    profile.phase("update", check_curr.shape[0])
+    for idx, row in check_curr.iterrows():
         row_dict = row.to_dict()
         this_id = row_dict["id"]
         del row_dict["id"]
@@ -268,15 +277,17 @@ def data_ingestion(db: Session, path: str = "utils/IDX_OUTPUT_NEW_REPORT.xlsx"):
 
     logger.info("UPDATING PHASE COMPLETED")
 
+    profile.phase("delete", to_del.shape[0])
     ts = datetime.strftime(datetime.now(), '%Y%m%d_%H%M%S')
     to_insert.to_csv(f"./assets/to_insert/" + ts + "_to_insert.csv")
     to_del.to_csv(f"./assets/to_del/" + ts + "_to_del.csv")
-    for idx, row in tqdm(to_del.iterrows()):
+    for idx, row in to_del.iterrows():
         db.query(Order).filter(Order.id == row["id"]).delete()
 
     logger.info("DELETING PHASE COMPLETED")
 
-    for idx, row in tqdm(to_insert.iterrows()):
+    profile.phase("insert", to_insert.shape[0])
+    for idx, row in to_insert.iterrows():
         row_dict = dict_mapping(row.to_dict(), col_mapping)
         try:
             db.add(Order(**row_dict))
@@ -285,8 +296,11 @@ def data_ingestion(db: Session, path: str = "utils/IDX_OUTPUT_NEW_REPORT.xlsx"):
 
     logger.info("INSERTING PHASE COMPLETED")
 
+    profile.phase("commit")
     db.commit()
+    bump_version("data", "cdl")
     logger.info("COMMIT COMPLETED")
+    profile.finish()
 
     return True
 
@@ -298,15 +312,19 @@ def flush_tags(db: Session):
     :return: True on successful completion.
     """
     logger.info("TAG FLUSH STARTED")
-    conn = db.get_bind()
+    profile = RunProfile("flush_tags")
+    profile.phase("read")
+    conn = db.connection()
     nyc_orders = pd.read_sql_query("""
     select n.*, notes.tracking_note, ei.cdl_flag, ei.tags
     from nyc_orders n left outer join extra_info ei on n.id = ei.id
     left outer join notes on n.id = notes.book_id""", con=conn)
     sensitive_barcodes = pd.read_sql_query("select barcode from sensitive_barcode", con=conn)
     local_vendors = [i.vendor_code for i in crud.get_local_vendors(db)]
+    profile.count(nyc_orders.shape[0])
     logger.info("DATA READY, MAIN ITERATION STARTED")
-    for _, row in tqdm(nyc_orders.iterrows()):
+    profile.phase("tag", nyc_orders.shape[0])
+    for _, row in nyc_orders.iterrows():
         tags = tag_finder(row, local_vendors, sensitive_barcodes)
         # insert into CDL table ONLY FOR NEW CDL entries (row["tags"] does not include CDL yet)
         if "CDL" in tags:
@@ -326,15 +344,25 @@ def flush_tags(db: Session):
             "tags = :tags;"
         )
         conn.execute(stmt, {"id": row["id"], "order_number": row["order_number"], "tags": tags})
+    profile.phase("commit")
+    db.commit()
     logger.info("TAG FLUSH COMPLETED")
 
+    bump_version("data", "cdl")
+    profile.phase("refresh")
+    crud.refresh_pending_due(db)
+    logger.info("PENDING DUE REFRESHED")
+    profile.finish()
+
     return True
 
 
 def flush_tags_upon_vendor_update(db: Session, vendor: str):
     vendor = vendor.replace("'", "''")
     logger.info(f"TAG FLUSH TRIGGERED BY VENDOR {vendor}.")
-    conn = db.get_bind()
+    profile = RunProfile("flush_tags_upon_vendor_update")
+    profile.phase("read")
+    conn = db.connection()
     nyc_orders = pd.read_sql_query(f"""
         select n.*, notes.tracking_note, ei.cdl_flag, ei.tags
         from nyc_orders n left outer join extra_info ei on n.id = ei.id
@@ -342,7 +370,9 @@ def flush_tags_upon_vendor_update(db: Session, vendor: str):
         where n.vendor_code = '{vendor}'""", con=conn)
     sensitive_barcodes = pd.read_sql_query("select barcode from sensitive_barcode", con=conn)
     local_vendors = [i.vendor_code for i in crud.get_local_vendors(db)]
-    for _, row in tqdm(nyc_orders.iterrows()):
+    profile.count(nyc_orders.shape[0])
+    profile.phase("tag", nyc_orders.shape[0])
+    for _, row in nyc_orders.iterrows():
         tags = tag_finder(row, local_vendors, sensitive_barcodes)
         stmt = text(
             "INSERT INTO extra_info (id, order_number, tags) "
@@ -351,6 +381,13 @@ def flush_tags_upon_vendor_update(db: Session, vendor: str):
             "tags = :tags;"
         )
         conn.execute(stmt, {"id": row["id"], "order_number": row["order_number"], "tags": tags})
+    profile.phase("commit")
+    db.commit()
     logger.info("TAG FLUSH COMPLETED")
 
+    # notify_in of the vendor may have changed
+    profile.phase("refresh")
+    crud.refresh_rush_local_due(db, [int(i) for i in nyc_orders["id"]])
+    profile.finish()
+
     return True
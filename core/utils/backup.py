@@ -0,0 +1,215 @@
+import io
+import os
+import csv
+import json
+import gzip
+import shutil
+import zipfile
+import tempfile
+import subprocess
+from datetime import datetime
+from loguru import logger
+from sqlalchemy import text, bindparam
+from core.database.database import SessionLocal
+from core.database.model import (
+    Order, ExtraInfo, CDLOrder, TrackingNote, Vendor, Preset, SensitiveBarcode, User
+)
+from core.gsuite.tools import LibSenseGSuite
+from core.utils.jobs import JobQueue
+
+BACKUP_DIR = "assets/db_backup"
+# bytes read from mysqldump per write into the compressor
+DUMP_BLOCK_SIZE = 1024 * 1024
+# in "auto" mode the full dump runs on this weekday (Monday is 0), incremental backups otherwise
+FULL_BACKUP_WEEKDAY = 6
+# first line of a full dump, records the change_log position the dump covers
+SEQ_HEADER = "-- libsense change_log seq: %d\n"
+# keys per statement when exporting or pruning change sets
+CHUNK_SIZE = 1000
+# NULL in change set files
+NULL = "\\N"
+# tables tracked by the change_log triggers (migration 003), by table name
+CHANGE_TABLES = {
+    model.__table__.name: model.__table__
+    for model in [Order, ExtraInfo, CDLOrder, TrackingNote, Vendor, Preset, SensitiveBarcode, User]
+}
+
+BACKUP_QUEUE = JobQueue("backup", workers=1, max_attempts=2, backoff=60.0)
+
+
+def change_log_position(db):
+    seq = db.execute(text("select max(seq) from change_log")).scalar()
+    # end the transaction, later reads must see changes committed in the meantime
+    db.commit()
+    return seq or 0
+
+
+def prune_change_log(db, seq=None, seqs=None):
+    """
+    Remove the change_log entries up to ``seq``, or exactly the entries in ``seqs``.
+    """
+    if seq is not None:
+        db.execute(text("delete from change_log where seq <= :seq"), {"seq": seq})
+    for idx in range(0, len(seqs or []), CHUNK_SIZE):
+        stmt = text("delete from change_log where seq in :seqs")
+        stmt = stmt.bindparams(bindparam("seqs", expanding=True))
+        db.execute(stmt, {"seqs": seqs[idx: idx + CHUNK_SIZE]})
+    db.commit()
+
+
+def dump_database(target_path, username, password, database="libsense", seq=None):
+    """
+    Pipe mysqldump straight into a gzip file, no uncompressed intermediate is written.
+    The password is passed through MYSQL_PWD instead of the command line, and no shell is involved.
+    A failed dump leaves no partial file behind.
+    """
+    env = {**os.environ, "MYSQL_PWD": password or ""}
+    base_args = ["mysqldump", "-u", username, "--single-transaction", "--quick"]
+    try:
+        with gzip.open(target_path, "wb") as out:
+            if seq is not None:
+                out.write((SEQ_HEADER % seq).encode())
+            # the change_log rows are not part of a full backup, but the table is:
+            # the dumped triggers insert into it
+            pipe_dump(base_args + ["--no-data", database, "change_log"], env, out)
+            pipe_dump(base_args + ["--ignore-table=%s.change_log" % database, database], env, out)
+    except BaseException:
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        raise
+
+
+def pipe_dump(args, env, out):
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr, env=env)
+        try:
+            shutil.copyfileobj(proc.stdout, out, DUMP_BLOCK_SIZE)
+        except BaseException:
+            # a failed write (disk full, interrupted job) must not leave mysqldump running
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if proc.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(
+                "mysqldump exited with %d: %s" % (proc.returncode, stderr.read().decode().strip())
+            )
+
+
+def csv_value(value):
+    if value is None:
+        return NULL
+    # booleans are stored as tinyint
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def export_change_set(db, archive_path, to_seq):
+    """
+    Write the current image of every row logged up to ``to_seq`` into a zip archive:
+    <table>.csv holds the rows that still exist, <table>.deleted.csv the keys of deleted rows,
+    and manifest.json the change_log position and row counts.
+    :return: (manifest, exported change_log seqs)
+    """
+    seqs = []
+    keys = {}
+    logged = text("select seq, table_name, row_key from change_log where seq <= :seq")
+    for seq, name, key in db.execute(logged, {"seq": to_seq}):
+        seqs.append(seq)
+        keys.setdefault(name, {})[key] = None
+
+    manifest = {"to_seq": to_seq, "created_at": datetime.now().isoformat(), "tables": {}}
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, table in CHANGE_TABLES.items():
+            table_keys = list(keys.get(name, {}))
+            if len(table_keys) == 0:
+                continue
+            pk = table.primary_key.columns.values()[0]
+            found = set()
+            entry = archive.open("%s.csv" % name, "w")
+            with io.TextIOWrapper(entry, encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(table.columns.keys())
+                for idx in range(0, len(table_keys), CHUNK_SIZE):
+                    chunk = table_keys[idx: idx + CHUNK_SIZE]
+                    for row in db.execute(table.select().where(pk.in_(chunk))):
+                        found.add(str(row._mapping[pk.name]))
+                        writer.writerow([csv_value(v) for v in row])
+            deleted = [k for k in table_keys if k not in found]
+            archive.writestr("%s.deleted.csv" % name, "\n".join(deleted))
+            manifest["tables"][name] = {"rows": len(found), "deleted": len(deleted)}
+        archive.writestr("manifest.json", json.dumps(manifest, indent=4))
+    db.commit()
+    return manifest, seqs
+
+
+def upload(filename, path, mimetype):
+    service = LibSenseGSuite()
+    service.initialize_drive()
+    if not service.upload_file(filename, path, mimetype=mimetype):
+        raise RuntimeError("An error occurs when uploading the file.")
+
+
+def run_backup(username, password):
+    """
+    Dump and upload the whole database to Google Drive. The change_log entries covered by the dump
+    are pruned afterwards, incremental backups continue from there.
+    :return: name of the uploaded file
+    """
+    ts = datetime.strftime(datetime.now(), "%Y%m%d_%H%M%S")
+    filename = f"libsense_{ts}.sql.gz"
+    target_path = os.path.join(BACKUP_DIR, filename)
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    db = SessionLocal()
+    try:
+        # taken before the dump starts, so every change up to seq is part of the dump
+        seq = change_log_position(db)
+        dump_database(target_path, username, password, seq=seq)
+        size = os.path.getsize(target_path)
+        logger.info("Database dumped to %s (%d bytes)" % (target_path, size))
+
+        upload(filename, target_path, "application/gzip")
+        prune_change_log(db, seq=seq)
+    finally:
+        db.close()
+    return filename
+
+
+def run_incremental_backup():
+    """
+    Upload the rows changed since the last backup (full or incremental) to Google Drive.
+    :return: name of the uploaded file, None if nothing changed
+    """
+    db = SessionLocal()
+    try:
+        seq = change_log_position(db)
+        if seq == 0:
+            return None
+        ts = datetime.strftime(datetime.now(), "%Y%m%d_%H%M%S")
+        filename = f"libsense_inc_{ts}.zip"
+        target_path = os.path.join(BACKUP_DIR, filename)
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        manifest, seqs = export_change_set(db, target_path, seq)
+        logger.info("Change set exported to %s: %s" % (target_path, manifest["tables"]))
+
+        upload(filename, target_path, "application/zip")
+        # only the exported entries, a transaction committing late may have logged below seq
+        prune_change_log(db, seqs=seqs)
+    finally:
+        db.close()
+    return filename
+
+
+def queue_backup(username, password, mode="full"):
+    """
+    :param mode: "full", "incremental", or "auto"
+        (full on FULL_BACKUP_WEEKDAY, incremental otherwise)
+    """
+    if mode == "auto":
+        mode = "full" if datetime.now().weekday() == FULL_BACKUP_WEEKDAY else "incremental"
+    if mode == "incremental":
+        return BACKUP_QUEUE.submit(run_incremental_backup)
+    return BACKUP_QUEUE.submit(run_backup, username, password)
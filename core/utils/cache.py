@@ -0,0 +1,190 @@
+import hashlib
+import threading
+from cachetools import TTLCache
+from loguru import logger
+from redis import RedisError
+
+_MISSING = object()
+_registry = {}
+_versions = {}
+_versions_lock = threading.Lock()
+_redis = None
+
+VERSION_KEY = "libsense:version:%s"
+
+
+def configure_redis(client):
+    """
+    Share data versions and cached results between worker processes through Redis.
+    Without Redis every process keeps its own versions and results.
+    """
+    global _redis
+    _redis = client
+
+
+def get_version(name="data"):
+    """
+    Current version of a dataset. Caches include it in their keys, so bumping the version
+    invalidates every entry built from the previous one.
+    """
+    if _redis is not None:
+        try:
+            return int(_redis.get(VERSION_KEY % name) or 0)
+        except RedisError as e:
+            logger.warning(f"Failed to read version {name} from redis: {e}")
+    return _versions.get(name, 0)
+
+
+def bump_version(*names):
+    for name in names or ["data"]:
+        with _versions_lock:
+            _versions[name] = _versions.get(name, 0) + 1
+        if _redis is not None:
+            try:
+                _redis.incr(VERSION_KEY % name)
+            except RedisError as e:
+                logger.warning(f"Failed to bump version {name} in redis: {e}")
+
+
+class InstrumentedCache:
+    """
+    Thread-safe wrapper around a cachetools cache which keeps hit/miss counters.
+    Every instance registers itself by name so the counters can be inspected via /internal.
+    """
+
+    def __init__(self, name, cache):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._cache = cache
+        self._lock = threading.RLock()
+        _registry[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def get_or_build(self, key, builder):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = builder()
+            self.set(key, value)
+        return value
+
+    def get_or_build_versioned(self, names, builder):
+        """
+        Entry keyed by the current versions of the datasets ``names``. A value built while one
+        of the versions changed is returned but not cached, it may predate that change.
+        """
+        key = tuple(get_version(name) for name in names)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = builder()
+            if tuple(get_version(name) for name in names) == key:
+                self.set(key, value)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            return self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+                "size": len(self._cache),
+                "max_size": self._cache.maxsize,
+            }
+
+
+class SharedResultCache:
+    """
+    Serialized responses shared by all workers through Redis (in-process when Redis is not
+    configured), keyed by view, data version and a hash of the normalized request.
+    Entries expire after ``ttl`` seconds and payloads above ``max_entry_size`` bytes are not stored.
+    """
+
+    def __init__(self, name, ttl=60, max_entry_size=512 * 1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_entry_size = max_entry_size
+        self._local = TTLCache(maxsize=256, ttl=ttl)
+        self._counters = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def _count(self, view, hit):
+        with self._lock:
+            counter = self._counters.setdefault(view, {"hits": 0, "misses": 0})
+            counter["hits" if hit else "misses"] += 1
+
+    def _get(self, key):
+        if _redis is None:
+            with self._lock:
+                return self._local.get(key)
+        try:
+            payload = _redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Failed to read cached result from redis: {e}")
+            return None
+        return payload.decode() if payload is not None else None
+
+    def _set(self, key, payload):
+        if _redis is None:
+            with self._lock:
+                self._local[key] = payload
+            return
+        try:
+            _redis.setex(key, self.ttl, payload)
+        except RedisError as e:
+            logger.warning(f"Failed to cache result in redis: {e}")
+
+    def get_or_build(self, view, request_key, builder):
+        """
+        :param view: name of the view, hit ratio is reported per view
+        :param request_key: normalized request, e.g. a pydantic model dumped with sorted keys
+        :param builder: callable returning the serialized payload on cache miss
+        :return: the serialized payload
+        """
+        version = get_version("data")
+        digest = hashlib.sha1(request_key.encode()).hexdigest()
+        key = "libsense:%s:%s:%d:%s" % (self.name, view, version, digest)
+        payload = self._get(key)
+        self._count(view, payload is not None)
+        if payload is None:
+            payload = builder()
+            # a payload built while the data changed may predate the change
+            if get_version("data") == version and len(payload.encode()) <= self.max_entry_size:
+                self._set(key, payload)
+        return payload
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for view, counter in self._counters.items():
+                lookups = counter["hits"] + counter["misses"]
+                stats[view] = {
+                    **counter,
+                    "hit_ratio": round(counter["hits"] / lookups, 4) if lookups else 0,
+                }
+            return stats
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _registry.items()}
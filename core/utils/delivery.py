@@ -0,0 +1,61 @@
+import os
+import json
+import uuid
+import shutil
+from datetime import datetime
+from core.gsuite.tools import LibSenseGSuite
+from core.utils.jobs import JobQueue
+
+OUTBOX_DIR = "assets/output/outbox"
+
+
+class GmailTransport:
+    def send(self, destination, nickname, count, attachments):
+        service = LibSenseGSuite()
+        service.initialize_mail()
+        service.send_message(destination, nickname, count, attachments)
+
+
+class FileDropTransport:
+    """
+    Stand-in for Gmail outside production: every message becomes a directory in ``directory``
+    holding message.json and copies of the attachments.
+    """
+
+    def __init__(self, directory=OUTBOX_DIR):
+        self.directory = directory
+
+    def send(self, destination, nickname, count, attachments):
+        name = "%s-%s" % (datetime.now().strftime("%Y%m%d_%H%M%S"), uuid.uuid4().hex[:8])
+        target = os.path.join(self.directory, name)
+        os.makedirs(target)
+        for path in attachments.values():
+            shutil.copy(path, target)
+        with open(os.path.join(target, "message.json"), "w") as f:
+            json.dump({
+                "to": destination,
+                "nickname": nickname,
+                "count": count,
+                "attachments": [os.path.basename(path) for path in attachments.values()],
+            }, f, indent=4)
+
+
+def get_transport():
+    if os.getenv("LIBSENSE_ENV", "Prod") == "Prod":
+        return GmailTransport()
+    return FileDropTransport()
+
+
+TRANSPORT = get_transport()
+DELIVERY_QUEUE = JobQueue("report-delivery", workers=2, max_attempts=5, backoff=5.0)
+
+
+def queue_report(destination, nickname, count, attachments, directory=None):
+    """
+    Send a report in the background, ``directory`` (the per-request temp dir) is removed afterwards.
+    :return: job id
+    """
+    cleanup = (lambda: shutil.rmtree(directory, ignore_errors=True)) if directory else None
+    return DELIVERY_QUEUE.submit(
+        TRANSPORT.send, destination, nickname, count, attachments, cleanup=cleanup
+    )
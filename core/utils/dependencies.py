@@ -1,9 +1,15 @@
+import time
 from fastapi import Request, HTTPException, status
-from core.database.database import SessionLocal
+from core.database.database import SessionLocal, ReadSessionLocal, AsyncSessionLocal
 from core.schema import EnumRole
 
+# reads of a client stay on the primary for a while after it wrote, covering replication lag
+PRIMARY_PIN_SECONDS = 10
 
-def get_db():
+
+def get_db(request: Request):
+    if request.method in ["POST", "PUT", "PATCH", "DELETE"]:
+        request.session["primary_until"] = time.time() + PRIMARY_PIN_SECONDS
     db = SessionLocal()
     try:
         yield db
@@ -11,6 +17,39 @@ def get_db():
         db.close()
 
 
+def pinned_to_primary(request: Request):
+    """
+    Whether the client wrote within PRIMARY_PIN_SECONDS. Its reads go to the primary and bypass
+    the shared caches, which may hold results built on a replica that has not caught up yet.
+    """
+    return request.session.get("primary_until", 0) > time.time()
+
+
+def read_session_factory(request: Request):
+    """
+    Session factory for reads of a client, the read replica unless the client wrote recently.
+    """
+    if pinned_to_primary(request):
+        return SessionLocal
+    return ReadSessionLocal
+
+
+def get_read_db(request: Request):
+    """
+    Session for read-only routes, on the read replica unless the client wrote recently.
+    """
+    db = read_session_factory(request)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def validate_auth(req: Request):
     if not req.session.get("username")\
             or not req.session.get("role")\
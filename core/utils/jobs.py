@@ -0,0 +1,95 @@
+import uuid
+import queue
+import threading
+from datetime import datetime
+from cachetools import TTLCache
+from loguru import logger
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    In-process background queue with retry. Failed jobs are re-queued after an exponential
+    backoff (``backoff * 2 ** (attempt - 1)`` seconds) until ``max_attempts`` is reached.
+    Job status is kept for a day, see ``status``.
+    """
+
+    def __init__(self, name, workers=1, max_attempts=3, backoff=5.0):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._jobs = TTLCache(maxsize=1024, ttl=86400)
+        self._lock = threading.Lock()
+        for idx in range(workers):
+            threading.Thread(target=self._work, name="%s-%d" % (name, idx), daemon=True).start()
+
+    def submit(self, func, *args, cleanup=None, **kwargs):
+        """
+        :param cleanup: called once the job succeeded or finally failed, e.g. to remove its files
+        :return: job id
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": QUEUED,
+                "attempts": 0,
+                "error": None,
+                "result": None,
+                "created_at": datetime.now(),
+                "finished_at": None,
+            }
+        self._queue.put((job_id, func, args, kwargs, cleanup))
+        return job_id
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _update(self, job_id, **values):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(values)
+                # re-assign to keep the entry alive for another TTL period
+                self._jobs[job_id] = job
+
+    def _work(self):
+        while True:
+            job_id, func, args, kwargs, cleanup = self._queue.get()
+            attempts = (self.status(job_id) or {"attempts": 0})["attempts"] + 1
+            self._update(job_id, status=RUNNING, attempts=attempts)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                logger.warning(f"Job {job_id} of {self.name} failed (attempt {attempts}): {e}")
+                if attempts < self.max_attempts:
+                    self._update(job_id, status=RETRYING, error=str(e))
+                    retry = threading.Timer(
+                        self.backoff * 2 ** (attempts - 1),
+                        self._queue.put,
+                        [(job_id, func, args, kwargs, cleanup)],
+                    )
+                    retry.daemon = True
+                    retry.start()
+                    continue
+                self._update(job_id, status=FAILED, error=str(e), finished_at=datetime.now())
+            else:
+                self._update(
+                    job_id, status=SUCCEEDED, error=None, result=result, finished_at=datetime.now()
+                )
+            finally:
+                self._queue.task_done()
+
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    logger.warning(f"Failed to clean up job {job_id} of {self.name}: {e}")
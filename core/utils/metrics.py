@@ -0,0 +1,250 @@
+import time
+import threading
+from contextvars import ContextVar
+from sqlalchemy import event
+from loguru import logger
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# statements per request
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+# characters of statements and parameter types in the slow query log
+SLOW_QUERY_LOG_LIMIT = 2000
+
+
+class SqlStats:
+    def __init__(self, parent=None):
+        # statements are also recorded into the parent, e.g. the request running a profiled phase
+        self.parent = parent
+        self.count = 0
+        self.time = 0.0
+        self.slow = 0
+
+    def record(self, elapsed, slow=False):
+        self.count += 1
+        self.time += elapsed
+        self.slow += int(slow)
+        if self.parent is not None:
+            self.parent.record(elapsed, slow)
+
+
+# statements of the current request, run_in_threadpool copies the context so sync routes share it
+REQUEST_SQL = ContextVar("request_sql", default=None)
+# statements of the whole process, including background jobs
+SQL_STATS = SqlStats()
+_sql_lock = threading.Lock()
+
+
+def describe_parameters(parameters, executemany=False):
+    """
+    Parameter names and types of a statement for the log. The values are left out, they can
+    hold passwords and other user data.
+    """
+    if executemany:
+        rows = list(parameters)
+        return "%d rows of %s" % (len(rows), describe_parameters(rows[0]) if rows else "()")
+    if isinstance(parameters, dict):
+        return "{%s}" % ", ".join(
+            "%s: %s" % (name, type(value).__name__) for name, value in parameters.items()
+        )
+    return "(%s)" % ", ".join(type(value).__name__ for value in parameters or ())
+
+
+def instrument_engine(engine, slow_query_seconds=0.5):
+    """
+    Count the statements of an engine and their time, attributed to the current request.
+    Statements slower than ``slow_query_seconds`` are logged with their parameter types.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        slow = elapsed > slow_query_seconds
+        with _sql_lock:
+            SQL_STATS.record(elapsed, slow)
+        stats = REQUEST_SQL.get()
+        if stats is not None:
+            stats.record(elapsed, slow)
+        if slow:
+            logger.warning("Slow query (%.1f ms): %s | parameters: %s" % (
+                elapsed * 1000,
+                " ".join(statement.split())[:SLOW_QUERY_LOG_LIMIT],
+                describe_parameters(parameters, executemany)[:SLOW_QUERY_LOG_LIMIT],
+            ))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+                break
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative))
+        lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, self.count))
+        lines.append("%s_sum{%s} %s" % (name, labels, round(self.sum, 6)))
+        lines.append("%s_count{%s} %d" % (name, labels, self.count))
+        return lines
+
+
+class RequestMetrics:
+    """
+    Per-route request counters, latency and payload size histograms, and in-flight requests.
+    Routes are labelled by their path template to keep the number of series bounded.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = {}
+        self.latency = {}
+        self.request_size = {}
+        self.response_size = {}
+        self.db_queries = {}
+        self.db_time = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, method, route, status, elapsed, request_size, response_size, sql=None):
+        key = (method, route)
+        sql = sql or SqlStats()
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.request_size.setdefault(key, Histogram(SIZE_BUCKETS)).observe(request_size)
+            self.response_size.setdefault(key, Histogram(SIZE_BUCKETS)).observe(response_size)
+            self.db_queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(sql.count)
+            self.db_time.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(sql.time)
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# TYPE libsense_http_requests_in_flight gauge",
+                "libsense_http_requests_in_flight %d" % self.in_flight,
+                "# TYPE libsense_http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                labels = 'method="%s",route="%s",status="%d"' % (method, route, status)
+                lines.append("libsense_http_requests_total{%s} %d" % (labels, count))
+            for name, histograms in [
+                ("libsense_http_request_duration_seconds", self.latency),
+                ("libsense_http_request_size_bytes", self.request_size),
+                ("libsense_http_response_size_bytes", self.response_size),
+                ("libsense_http_request_db_queries", self.db_queries),
+                ("libsense_http_request_db_seconds", self.db_time),
+            ]:
+                lines.append("# TYPE %s histogram" % name)
+                for (method, route), histogram in sorted(histograms.items()):
+                    lines.extend(histogram.render(name, 'method="%s",route="%s"' % (method, route)))
+        with _sql_lock:
+            lines.extend([
+                "# TYPE libsense_db_queries_total counter",
+                "libsense_db_queries_total %d" % SQL_STATS.count,
+                "# TYPE libsense_db_query_seconds_total counter",
+                "libsense_db_query_seconds_total %s" % round(SQL_STATS.time, 6),
+                "# TYPE libsense_db_slow_queries_total counter",
+                "libsense_db_slow_queries_total %d" % SQL_STATS.slow,
+            ])
+        return lines
+
+
+REQUEST_METRICS = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware feeding REQUEST_METRICS. Payload sizes are counted from the body messages,
+    so streamed requests and responses are measured as well. The statements run until the
+    response starts are reported in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def route_of(self, scope):
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint")
+            }
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        state = {"status": 500, "request_size": 0, "response_size": 0}
+        sql = SqlStats()
+        token = REQUEST_SQL.set(sql)
+
+        async def receive_wrapper():
+            message = await receive()
+            state["request_size"] += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                timing = 'db;dur=%.1f;desc="%d queries", app;dur=%.1f' % (
+                    sql.time * 1000, sql.count, (time.perf_counter() - start) * 1000
+                )
+                headers = list(message.get("headers", []))
+                message["headers"] = headers + [(b"server-timing", timing.encode())]
+            elif message["type"] == "http.response.body":
+                state["response_size"] += len(message.get("body", b""))
+            await send(message)
+
+        REQUEST_METRICS.start()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            REQUEST_SQL.reset(token)
+            REQUEST_METRICS.finish(
+                scope["method"],
+                self.route_of(scope),
+                state["status"],
+                time.perf_counter() - start,
+                state["request_size"],
+                state["response_size"],
+                sql,
+            )
+
+
+def render_stats(prefix, stats, labels=""):
+    """
+    Flatten nested numeric stats (e.g. cache_stats(), pool_stats()) into gauges,
+    nested keys become labels.
+    """
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            label = '%s="%s"' % ("name" if not labels else "view", key)
+            lines.extend(render_stats(prefix, value, ",".join(filter(None, [labels, label]))))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = "%s_%s" % (prefix, key)
+            lines.append("%s{%s} %s" % (name, labels, value) if labels else "%s %s" % (name, value))
+    return lines
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import resource
+from datetime import datetime
+from loguru import logger
+from core.utils.metrics import REQUEST_SQL, SqlStats
+
+PROFILE_DIR = "logs/profiles"
+
+
+class RunProfile:
+    """
+    Phase timings of one run of a batch job (ingestion, tag flush...). Phases are sequential:
+    starting a phase ends the previous one. Each phase records wall time, rows processed,
+    rows per second, DB statements and time, and the peak RSS of the process so far.
+    ``finish`` logs the summary as one JSON line and appends it to logs/profiles/<name>.jsonl.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now()
+        self.phases = []
+        self._current = None
+        self._start = time.perf_counter()
+
+    def phase(self, name, rows=0):
+        self._end_phase()
+        sql = SqlStats(parent=REQUEST_SQL.get())
+        self._current = {
+            "name": name,
+            "rows": rows,
+            "sql": sql,
+            "start": time.perf_counter(),
+            "token": REQUEST_SQL.set(sql),
+        }
+
+    def count(self, rows):
+        self._current["rows"] = rows
+
+    def _end_phase(self):
+        if self._current is None:
+            return
+        current, self._current = self._current, None
+        REQUEST_SQL.reset(current["token"])
+        elapsed = time.perf_counter() - current["start"]
+        self.phases.append({
+            "phase": current["name"],
+            "seconds": round(elapsed, 3),
+            "rows": current["rows"],
+            "rows_per_second": round(current["rows"] / elapsed, 1) if elapsed > 0 else None,
+            "db_queries": current["sql"].count,
+            "db_seconds": round(current["sql"].time, 3),
+            "peak_rss_mb": peak_rss_mb(),
+        })
+
+    def finish(self):
+        self._end_phase()
+        summary = {
+            "run": self.name,
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(time.perf_counter() - self._start, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "phases": self.phases,
+        }
+        line = json.dumps(summary)
+        logger.info(line)
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, "%s.jsonl" % self.name), "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to keep the profile of {self.name}: {e}")
+        return summary
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
@@ -0,0 +1,328 @@
+import io
+import os
+import time
+import fcntl
+import csv
+import glob
+import gzip
+import json
+import shutil
+import zlib
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from loguru import logger
+from openpyxl import Workbook
+from core.database import crud
+from core.utils.cache import get_version
+
+# rows fetched from the server-side cursor per round trip
+STREAM_CHUNK_SIZE = 2000
+
+# pre-generated reports, gzip compressed, one sidecar per report type and day
+ARTIFACT_DIR = "assets/output/reports"
+# replaced artifacts are kept for a while, a reader may have resolved them just before
+ARTIFACT_GRACE = timedelta(minutes=10)
+# an artifact is current while none of these data versions changed since it was built
+ARTIFACT_VERSIONS = ("data", "cdl")
+
+REPORT_BUILDERS = {
+    "RushLocal": crud.get_overdue_rush_local,
+    "CDLOrder": crud.get_overdue_cdl,
+    "ShanghaiOrder": crud.get_sh_order_report,
+}
+
+
+@contextmanager
+def stream_result(db, statement):
+    """
+    Execute a statement on an unbuffered (server-side) cursor, fetch rows with result.partitions().
+    """
+    result = db.execute(statement, execution_options={"stream_results": True})
+    try:
+        yield result
+    finally:
+        result.close()
+
+
+def write_csv(db, statement, file_path, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream the result of a statement into a CSV file, memory use is bounded by ``chunk_size``.
+    :return: number of rows written
+    """
+    count = 0
+    with stream_result(db, statement) as result, open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(result.keys())
+        for rows in result.partitions(chunk_size):
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def iter_csv(db, statement, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream the result of a statement as UTF-8 CSV, one encoded block per chunk of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    with stream_result(db, statement) as result:
+        writer.writerow(result.keys())
+        for rows in result.partitions(chunk_size):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_xlsx(db, statement, chunk_size=STREAM_CHUNK_SIZE, block_size=64 * 1024):
+    """
+    Stream the result of a statement as an XLSX workbook. openpyxl write-only mode spools
+    rows to disk, so memory use does not grow with the number of rows.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    with stream_result(db, statement) as result:
+        ws.append(list(result.keys()))
+        for rows in result.partitions(chunk_size):
+            for row in rows:
+                ws.append(list(row))
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        block = f.read(block_size)
+        while block:
+            yield block
+            block = f.read(block_size)
+
+
+def iter_gzip(blocks, level=6):
+    """
+    Gzip a stream of byte blocks on the fly.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def generate_report(session_factory, report_type, directory="temp"):
+    """
+    Build one report into a CSV file, on its own session since sessions are not thread-safe.
+    :return: (number of rows, file path)
+    """
+    file_path = "%s/Report-%s-%s.csv" % (directory, report_type, date.today().strftime("%Y-%m-%d"))
+    db = session_factory()
+    try:
+        statement = REPORT_BUILDERS[report_type](db, 0, -1, for_pandas=True)
+        return write_csv(db, statement, file_path), file_path
+    finally:
+        db.close()
+
+
+def sidecar_path(report_type, day=None):
+    day = day or date.today().strftime("%Y-%m-%d")
+    return "%s/Report-%s-%s.json" % (ARTIFACT_DIR, report_type, day)
+
+
+@contextmanager
+def build_lock():
+    """
+    Exclusive lock across the worker processes of this host, so every artifact is built once.
+    """
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    with open(os.path.join(ARTIFACT_DIR, ".build.lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def data_versions():
+    return [get_version(name) for name in ARTIFACT_VERSIONS]
+
+
+def is_current(sidecar, versions):
+    return sidecar is not None and sidecar.get("versions") == versions
+
+
+def read_sidecar(report_type):
+    try:
+        with open(sidecar_path(report_type)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_artifact(session_factory, report_type):
+    """
+    Build today's report into ARTIFACT_DIR. Every build writes a new file and the JSON sidecar
+    (row count, generation time, data versions and file name) is replaced atomically to point
+    to it, so readers which resolved the previous file can still open it. Files are pruned after
+    ARTIFACT_GRACE.
+    :return: the sidecar
+    """
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    # read before the build: a write committed meanwhile leaves the artifact stale
+    versions = data_versions()
+    generated_at = datetime.now()
+    day = generated_at.strftime("%Y-%m-%d")
+    stamp = generated_at.strftime("%H%M%S%f")
+    path = "%s/Report-%s-%s-%s.csv.gz" % (ARTIFACT_DIR, report_type, day, stamp)
+    with tempfile.TemporaryDirectory(dir=ARTIFACT_DIR) as tmp:
+        count, csv_path = generate_report(session_factory, report_type, tmp)
+        with open(csv_path, "rb") as src, gzip.open(csv_path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        sidecar = {
+            "count": count,
+            "generated_at": generated_at.isoformat(),
+            "versions": versions,
+            "path": path,
+        }
+        with open(csv_path + ".json", "w") as f:
+            json.dump(sidecar, f)
+        os.replace(csv_path + ".gz", path)
+        os.replace(csv_path + ".json", sidecar_path(report_type, day))
+
+    prune_artifacts(report_type, keep=[path, sidecar_path(report_type, day)])
+    return sidecar
+
+
+def build_artifacts(session_factory, report_types):
+    """
+    Build several artifacts concurrently, one connection per report.
+    :return: {report type: sidecar}
+    """
+    if len(report_types) == 0:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(report_types)) as pool:
+        # each task runs in a copy of the caller's context, e.g. to attribute its SQL to the request
+        futures = {
+            rt: pool.submit(contextvars.copy_context().run, build_artifact, session_factory, rt)
+            for rt in report_types
+        }
+        return {rt: future.result() for rt, future in futures.items()}
+
+
+def prune_artifacts(report_type, keep):
+    deadline = time.time() - ARTIFACT_GRACE.total_seconds()
+    for f in glob.glob("%s/Report-%s-*" % (ARTIFACT_DIR, report_type)):
+        if f not in keep and os.path.getmtime(f) < deadline:
+            os.remove(f)
+
+
+def get_artifacts(session_factory, report_types):
+    """
+    Current artifacts of the day. The ones not built yet, or built before the data they report
+    on changed, are (re)built concurrently.
+    :return: {report type: sidecar}, a sidecar being
+        {"count": rows, "generated_at": ISO timestamp, "versions": data versions,
+         "path": artifact path}
+    """
+    versions = data_versions()
+    sidecars = {rt: read_sidecar(rt) for rt in dict.fromkeys(report_types)}
+    if not all(is_current(sidecar, versions) for sidecar in sidecars.values()):
+        with build_lock():
+            # another process may have built some of them while we waited
+            versions = data_versions()
+            sidecars = {rt: read_sidecar(rt) for rt in sidecars}
+            stale = [rt for rt, sidecar in sidecars.items() if not is_current(sidecar, versions)]
+            sidecars.update(build_artifacts(session_factory, stale))
+    return sidecars
+
+
+def get_artifact(session_factory, report_type):
+    return get_artifacts(session_factory, [report_type])[report_type]
+
+
+def get_reports(session_factory, report_types, directory="temp"):
+    """
+    Reports served from the pre-generated artifacts, the CSV files are decompressed into
+    ``directory`` for attaching.
+    :return: ({report type: number of rows}, {report type: file path}, {report type: generated_at})
+    """
+    count = {}
+    attachments = {}
+    generated_at = {}
+    for rt, sidecar in get_artifacts(session_factory, report_types).items():
+        count[rt] = sidecar["count"]
+        generated_at[rt] = sidecar["generated_at"]
+        attachments[rt] = "%s/Report-%s-%s.csv" % (directory, rt, date.today().strftime("%Y-%m-%d"))
+        with gzip.open(sidecar["path"], "rb") as src, open(attachments[rt], "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    return count, attachments, generated_at
+
+
+def pregenerate_reports(session_factory, since=None):
+    """
+    :param since: skip reports already generated at or after this time (e.g. by another worker),
+    None rebuilds every report, e.g. after an ingestion.
+    """
+    with build_lock():
+        report_types = []
+        for rt in REPORT_BUILDERS:
+            sidecar = read_sidecar(rt)
+            if since is not None and sidecar is not None \
+                    and datetime.fromisoformat(sidecar["generated_at"]) >= since:
+                continue
+            report_types.append(rt)
+        for rt, sidecar in build_artifacts(session_factory, report_types).items():
+            logger.info("Pre-generated %s report with %d rows" % (rt, sidecar["count"]))
+
+
+class ReportScheduler(threading.Thread):
+    """
+    Builds the reports once a day at ``run_at`` (HH:MM, local time), and whenever triggered,
+    e.g. after the morning ingestion. Every worker process runs one; the build lock and the
+    generation time of the artifacts make sure the scheduled build happens once per host.
+    """
+
+    def __init__(self, session_factory, run_at="07:00"):
+        super().__init__(name="report-scheduler", daemon=True)
+        self.session_factory = session_factory
+        self.run_at = datetime.strptime(run_at, "%H:%M").time()
+        self._wake = threading.Event()
+
+    def next_run(self):
+        now = datetime.now()
+        next_run = datetime.combine(now.date(), self.run_at)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return next_run
+
+    def trigger(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            scheduled = self.next_run()
+            triggered = self._wake.wait(timeout=(scheduled - datetime.now()).total_seconds())
+            self._wake.clear()
+            try:
+                pregenerate_reports(self.session_factory, None if triggered else scheduled)
+            except Exception as e:
+                logger.error(f"Failed to pre-generate reports: {e}")
+
+
+_scheduler = None
+
+
+def start_scheduler(session_factory, run_at="07:00"):
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReportScheduler(session_factory, run_at)
+        _scheduler.start()
+    return _scheduler
+
+
+def trigger_pregeneration():
+    if _scheduler is not None:
+        _scheduler.trigger()
@@ -0,0 +1,123 @@
+import io
+import os
+import csv
+import sys
+import gzip
+import json
+import shutil
+import zipfile
+import subprocess
+from sqlalchemy import text, bindparam
+from core.database import crud
+from core.database.database import engine, config, SessionLocal
+from core.utils.backup import CHANGE_TABLES, CHUNK_SIZE, NULL, SEQ_HEADER
+
+
+def dump_position(dump_path):
+    """
+    change_log position recorded in the first line of a full dump, 0 for dumps without it.
+    """
+    prefix = SEQ_HEADER.split("%d")[0]
+    with gzip.open(dump_path, "rt") as f:
+        line = f.readline()
+    return int(line[len(prefix):]) if line.startswith(prefix) else 0
+
+
+def load_dump(dump_path):
+    env = {**os.environ, "MYSQL_PWD": config["password"]}
+    args = [
+        "mysql", "-h", config["server_addr"], "-P", str(config["server_port"]),
+        "-u", config["username"], config["database"],
+    ]
+    proc = subprocess.Popen(args, stdin=subprocess.PIPE, env=env)
+    with gzip.open(dump_path, "rb") as f:
+        shutil.copyfileobj(f, proc.stdin, 1024 * 1024)
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise RuntimeError("mysql exited with %d while loading %s" % (proc.returncode, dump_path))
+
+
+def read_manifest(archive_path):
+    with zipfile.ZipFile(archive_path) as archive:
+        return json.loads(archive.read("manifest.json"))
+
+
+def apply_change_set(conn, archive_path):
+    """
+    Replace every row of the change set: rows logged in it are deleted, then the exported
+    images of the rows that still existed are inserted again.
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        for name in manifest["tables"]:
+            pk = CHANGE_TABLES[name].primary_key.columns.values()[0]
+            deleted = [k for k in archive.read("%s.deleted.csv" % name).decode().split("\n") if k]
+            with io.TextIOWrapper(archive.open("%s.csv" % name), encoding="utf-8", newline="") as f:
+                reader = csv.reader(f)
+                cols = next(reader)
+                rows = [
+                    {c: (None if v == NULL else v) for c, v in zip(cols, row)} for row in reader
+                ]
+
+            keys = deleted + [row[pk.name] for row in rows]
+            delete = text("delete from `%s` where `%s` in :keys" % (name, pk.name)) \
+                .bindparams(bindparam("keys", expanding=True))
+            # plain text statements, MySQL converts the values to the column types
+            insert = text("insert into `%s` (%s) values (%s)" % (
+                name, ", ".join("`%s`" % c for c in cols), ", ".join(":%s" % c for c in cols)
+            ))
+            for idx in range(0, len(keys), CHUNK_SIZE):
+                conn.execute(delete, {"keys": keys[idx: idx + CHUNK_SIZE]})
+            for idx in range(0, len(rows), CHUNK_SIZE):
+                conn.execute(insert, rows[idx: idx + CHUNK_SIZE])
+    return manifest
+
+
+def replay_order(seq, archives):
+    """
+    Order change sets for replay on top of a full dump taken at change_log position ``seq``.
+    :param archives: (to_seq, path) of every change set, in any order
+    :return: (paths to apply oldest first, paths already covered by the dump)
+    """
+    archives = sorted(archives)
+    to_apply = [path for to_seq, path in archives if to_seq > seq]
+    covered = [path for to_seq, path in archives if to_seq <= seq]
+    return to_apply, covered
+
+
+def restore(dump_path, archive_paths):
+    seq = dump_position(dump_path)
+    to_apply, covered = replay_order(seq, [(read_manifest(p)["to_seq"], p) for p in archive_paths])
+    print("Loading full dump %s (change_log position %d)" % (dump_path, seq))
+    load_dump(dump_path)
+    for path in covered:
+        print("Skipping %s, covered by the full dump" % path)
+
+    with engine.begin() as conn:
+        conn.execute(text("set foreign_key_checks = 0"))
+        for path in to_apply:
+            manifest = apply_change_set(conn, path)
+            print("Applied %s: %s" % (path, manifest["tables"]))
+        conn.execute(text("set foreign_key_checks = 1"))
+        # the replay went through the change_log triggers, the restored state is the new baseline
+        conn.execute(text("delete from change_log"))
+
+    # pending_due is derived and not tracked by the change log
+    db = SessionLocal()
+    try:
+        crud.refresh_pending_due(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] in ["-h", "--help"]:
+        print(
+            """
+        USAGE: python -m core.utils.restore [FULL_DUMP.sql.gz] [INCREMENTAL.zip ...]
+        e.g. python -m core.utils.restore libsense_20221002_020000.sql.gz libsense_inc_2022100*.zip
+        OUTPUT: DATABASE IN configs/config.json RESTORED FROM THE DUMP AND THE LATER CHANGE SETS
+        """
+        )
+        sys.exit(0)
+    restore(sys.argv[1], sys.argv[2:])
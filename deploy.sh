@@ -34,6 +34,9 @@ else
     git pull
 
     pip3 install -r requirements.txt
+
+    echo "Applying database migrations..."
+    python3 -m core.database.migrate || exit 1
 fi
 
 echo "Done!"
\ No newline at end of file
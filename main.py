@@ -15,12 +15,17 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from core.logger import CustomizeLogger
 from core.schema import Overview
+from core.database import crud
+from core.database.database import SessionLocal, ReadSessionLocal, named_lock
+from core.utils import cache, report
+from core.utils.metrics import MetricsMiddleware
 from v1 import api
 
 with open("configs/config.json") as cfg:
     json_cfg = json.load(cfg)
     SESSION_SECRET = json_cfg['session_key']
     redis_cfg = json_cfg['redis_config']
+    report_cfg = json_cfg.get('report_config', {})
 
 ENV = os.getenv("LIBSENSE_ENV", "PROD")
 logger = CustomizeLogger.make_logger(ENV)
@@ -33,6 +38,7 @@ class SystemSettings(BaseSettings):
 def create_app() -> FastAPI:
     app = FastAPI(title="NYU Shanghai Library WMS", debug=False)
     app.logger = logger
+    app.add_middleware(MetricsMiddleware)
     return app
 
 
@@ -54,6 +60,7 @@ if ENV == "TEST":
     )
 else:
     redis_client = Redis(host=redis_cfg["host"], port=redis_cfg["port"], password=redis_cfg["password"])
+    cache.configure_redis(redis_client)
     app.add_middleware(
         SessionMiddleware,
         secret_key=SESSION_SECRET,
@@ -65,6 +72,29 @@ else:
 
 app.include_router(api.router)
 
+
+@app.on_event("startup")
+def refresh_pending_due():
+    # backfill pending_due after deployment, it is maintained by the write paths afterwards.
+    # one worker refreshes, the others start right away; only rows whose due changed are written.
+    db = SessionLocal()
+    try:
+        with named_lock("libsense:refresh_pending_due") as acquired:
+            if acquired:
+                crud.refresh_pending_due(db)
+    except Exception as e:
+        logger.error(f"Failed to refresh pending due timestamps: {e}")
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def start_report_scheduler():
+    # pre-generation reads from the replica so it does not compete with ingestion on the primary.
+    # uploads trigger a rebuild, and stale artifacts are rebuilt on request.
+    report.start_scheduler(ReadSessionLocal, report_cfg.get("pregenerate_at", "07:00"))
+
+
 if __name__ == '__main__':
     os.environ["LIBSENSE_ENV"] = "TEST"
     uvicorn.run(app="main:app", host="0.0.0.0", port=8081, reload=True)
@@ -0,0 +1,21 @@
+from datetime import date, datetime
+from core.database.crud import assign_columns
+from core.database.model import ExtraInfo, CDLOrder
+
+
+def test_equal_date_is_not_a_change():
+    info = ExtraInfo(override_reminder_time=datetime(2022, 5, 1), checked=True)
+    changed = assign_columns(info, {"override_reminder_time": date(2022, 5, 1), "checked": True})
+    assert changed == set()
+    assert info.override_reminder_time == datetime(2022, 5, 1)
+
+
+def test_dates_match_the_column_type():
+    cdl = CDLOrder(back_to_karms_date="2022-05-01", pdf_delivery_date=None)
+    changed = assign_columns(cdl, {
+        "back_to_karms_date": date(2022, 5, 1),
+        "pdf_delivery_date": date(2022, 5, 2),
+    })
+    assert changed == {"pdf_delivery_date"}
+    assert cdl.back_to_karms_date == "2022-05-01"
+    assert cdl.pdf_delivery_date == datetime(2022, 5, 2)
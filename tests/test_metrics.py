@@ -0,0 +1,61 @@
+from core.utils.metrics import (
+    Histogram, RequestMetrics, SqlStats, describe_parameters, render_stats
+)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 5))
+    for value in [0.5, 3, 3, 10]:
+        histogram.observe(value)
+    assert histogram.render("latency", 'route="/x"') == [
+        'latency_bucket{route="/x",le="1"} 1',
+        'latency_bucket{route="/x",le="5"} 3',
+        'latency_bucket{route="/x",le="+Inf"} 4',
+        'latency_sum{route="/x"} 16.5',
+        'latency_count{route="/x"} 4',
+    ]
+
+
+def test_request_metrics_render():
+    metrics = RequestMetrics()
+    metrics.start()
+    metrics.finish("GET", "/v1/overview", 200, 0.02, 0, 512, SqlStats())
+    lines = metrics.render()
+    assert "libsense_http_requests_in_flight 0" in lines
+    assert 'libsense_http_requests_total{method="GET",route="/v1/overview",status="200"} 1' in lines
+    assert (
+        'libsense_http_request_duration_seconds_count{method="GET",route="/v1/overview"} 1' in lines
+    )
+    # every sample line is "<name>{<labels>} <value>" or "<name> <value>"
+    for line in lines:
+        if not line.startswith("#"):
+            assert len(line.rsplit(" ", 1)) == 2
+
+
+def test_render_stats_flattens_nested_keys_into_labels():
+    stats = {
+        "primary": {"checked_out": 2, "total_wait_seconds": 0.5},
+        "async": {"checked_out": 1},
+        "enabled": True,
+        "note": "skipped",
+    }
+    assert render_stats("libsense_pool", stats) == [
+        'libsense_pool_checked_out{name="primary"} 2',
+        'libsense_pool_total_wait_seconds{name="primary"} 0.5',
+        'libsense_pool_checked_out{name="async"} 1',
+    ]
+
+
+def test_render_stats_second_level_is_a_view_label():
+    stats = {"order_results": {"all_orders": {"hits": 3}}, "metadata": {"hits": 1}}
+    assert render_stats("libsense_cache", stats) == [
+        'libsense_cache_hits{name="order_results",view="all_orders"} 3',
+        'libsense_cache_hits{name="metadata"} 1',
+    ]
+
+
+def test_describe_parameters_leaves_out_values():
+    assert describe_parameters({"username": "u", "password": "secret", "id": 3}) == \
+        "{username: str, password: str, id: int}"
+    assert describe_parameters(("secret", None)) == "(str, NoneType)"
+    assert describe_parameters([{"id": 1}, {"id": 2}], executemany=True) == "2 rows of {id: int}"
@@ -0,0 +1,63 @@
+from core import schema
+from core.database.utils import ColumnResolver, normalize_filters
+
+RESOLVER = ColumnResolver({
+    "ExtraInfo": ["tags", "checked", "attention"],
+    "TrackingNote": ["tracking_note"],
+    "default": "Order",
+})
+
+
+def field_filter(op, col, val):
+    return schema.FieldFilter(op=op, col=col, val=val)
+
+
+def test_no_filters():
+    assert normalize_filters(None, RESOLVER) == ((), {})
+    assert normalize_filters([], RESOLVER) == ((), {})
+
+
+def test_tags_bind_one_pattern_per_tag():
+    shape, params = normalize_filters([field_filter("in", "tags", ["Rush", "Local"])], RESOLVER)
+    assert shape == (("tags", "in", 2),)
+    assert params == {"f0_0": "%[Rush]%", "f0_1": "%[Local]%"}
+
+
+def test_in_splits_null_from_values():
+    shape, params = normalize_filters([field_filter("in", "vendorCode", ["A", None])], RESOLVER)
+    assert shape == (("vendor_code", "in", True),)
+    assert params == {"f0": ["A"]}
+
+
+def test_like_null_binds_nothing():
+    shape, params = normalize_filters([field_filter("like", "title", None)], RESOLVER)
+    assert shape == (("title", "like", True),)
+    assert params == {}
+
+
+def test_between_binds_both_bounds():
+    shape, params = normalize_filters(
+        [field_filter("between", "created_date", ["2022-01-01", "2022-02-01"])], RESOLVER
+    )
+    assert shape == (("created_date", "between", 2),)
+    assert params == {"f0_0": "2022-01-01", "f0_1": "2022-02-01"}
+
+
+def test_same_shape_for_different_values():
+    first = normalize_filters([field_filter("like", "title", "a")], RESOLVER)
+    second = normalize_filters([field_filter("like", "title", "b")], RESOLVER)
+    assert first[0] == second[0]
+    assert first[1] != second[1]
+
+
+def test_camel_and_snake_case_share_a_shape():
+    camel, _ = normalize_filters([field_filter("in", "vendorCode", ["A"])], RESOLVER)
+    snake, _ = normalize_filters([field_filter("in", "vendor_code", ["A"])], RESOLVER)
+    assert camel == snake
+
+
+def test_params_are_numbered_by_position():
+    filters = [field_filter("like", "title", "a"), field_filter("like", "bsn", "b")]
+    shape, params = normalize_filters(filters, RESOLVER)
+    assert [s[0] for s in shape] == ["title", "bsn"]
+    assert params == {"f0": "%a%", "f1": "%b%"}
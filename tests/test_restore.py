@@ -0,0 +1,17 @@
+from core.utils.restore import replay_order
+
+
+def test_change_sets_replayed_oldest_first():
+    to_apply, covered = replay_order(0, [(30, "c.zip"), (10, "a.zip"), (20, "b.zip")])
+    assert to_apply == ["a.zip", "b.zip", "c.zip"]
+    assert covered == []
+
+
+def test_change_sets_covered_by_the_dump_are_skipped():
+    to_apply, covered = replay_order(20, [(30, "c.zip"), (10, "a.zip"), (20, "b.zip")])
+    assert to_apply == ["c.zip"]
+    assert covered == ["a.zip", "b.zip"]
+
+
+def test_nothing_to_replay():
+    assert replay_order(5, []) == ([], [])
@@ -1,13 +1,15 @@
 import aiofiles
-from core.utils import Data
+from core.utils import Data, report
 from starlette import status
-from fastapi import APIRouter, File, Header, Depends, UploadFile, HTTPException
+from fastapi import APIRouter, File, Header, Depends, UploadFile, HTTPException, Request, Response
 from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from core.database import crud
 from loguru import logger
 from core import schema
-from core.utils.dependencies import get_db, validate_auth, validate_privilege
+from core.utils.dependencies import (
+    get_db, get_read_db, pinned_to_primary, validate_auth, validate_privilege
+)
 
 router = APIRouter(prefix="/data", tags=["Data"], dependencies=[Depends(validate_auth)])
 
@@ -54,6 +56,8 @@ async def upload_file(
 
     await run_in_threadpool(lambda: Data.data_ingestion(db, output_file))
     await run_in_threadpool(lambda: Data.flush_tags(db))
+    await run_in_threadpool(lambda: crud.rebuild_metadata_snapshot(db))
+    report.trigger_pregeneration()
 
     return {"msg": "Successfully uploaded file: %s" % file.filename}
 
@@ -76,25 +80,12 @@ async def update_sensitive(
 
 
 @router.get("/metadata", response_model=schema.MetaData)
-async def get_metadata(db: Session = Depends(get_db)):
-    tags = [e.value for e in schema.Tags]
-    vendors = crud.get_vendor_meta(db)
-    ips = crud.get_ips_meta(db)
-    oldest_date = crud.get_oldest_date(db)
-    material = crud.get_material_meta(db)
-    material_type = crud.get_material_type_meta(db)
-    cdl_tags = [i for i in schema.CDLStatus]
-    supported_report = [r for r in schema.ReportTypes]
-    physical_copy_status = crud.get_physical_copy_meta(db)
-
-    return schema.MetaData(
-        ips_code=[i[0] for i in ips],
-        vendors=[v[0] for v in vendors],
-        tags=tags,
-        oldest_date=oldest_date,
-        material=[m[0] for m in material],
-        material_type=[mt[0] for mt in material_type],
-        cdl_tags=cdl_tags,
-        supported_report=supported_report,
-        physical_copy_status=[p[0] for p in physical_copy_status]
-    )
+async def get_metadata(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    if pinned_to_primary(request):
+        metadata, etag = await run_in_threadpool(crud.build_metadata, db)
+    else:
+        metadata, etag = await run_in_threadpool(crud.get_metadata_snapshot, db)
+    if etag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return metadata
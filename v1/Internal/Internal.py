@@ -1,10 +1,11 @@
-import os
-import subprocess
-from datetime import datetime
-from fastapi import APIRouter, Depends, Request
-from core.gsuite.tools import LibSenseGSuite
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import PlainTextResponse
+from core.utils.backup import BACKUP_QUEUE, queue_backup
+from core.utils.cache import cache_stats
+from core.utils.metrics import REQUEST_METRICS, render_stats
+from core.database.database import pool_stats
 from starlette.exceptions import HTTPException
-from core.schema import BasicResponse
+from core.schema import JobResponse, JobStatus
 
 
 def internal_dependency(req: Request):
@@ -15,25 +16,38 @@ def internal_dependency(req: Request):
 router = APIRouter(prefix="/internal", dependencies=[Depends(internal_dependency)])
 
 
-@router.get("/backup", response_model=BasicResponse)
-def mysql_backup(username=None, password=None):
-    ts = datetime.strftime(datetime.now(), "%Y%m%d_%H%M%S")
-    target_path = os.path.join(os.getcwd(), "assets/db_backup/", f"libsense_{ts}.sql")
-    proc = subprocess.Popen(
-        [f"mysqldump -u{username} -p{password} libsense > {target_path}"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        shell=True
-    )
-    proc.wait()
+@router.get("/backup", response_model=JobResponse)
+def mysql_backup(
+        username=None,
+        password=None,
+        mode: str = Query("full", regex="^(full|incremental|auto)$"),
+):
+    job_id = queue_backup(username, password, mode)
+    return JobResponse(msg="Backup started.", job_id=job_id)
 
-    service = LibSenseGSuite()
-    service.initialize_drive()
-    result = service.upload_file(f"libsense_{ts}.sql", target_path)
-    if result:
-        return BasicResponse(msg=f"Last backup time: {ts}")
-    else:
-        raise HTTPException(status_code=500, detail="An error occurs when uploading the file.")
 
+@router.get("/backup/{job_id}", response_model=JobStatus)
+def get_backup_job(job_id: str):
+    job = BACKUP_QUEUE.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
 
 
+@router.get("/cache-stats")
+def get_cache_stats():
+    return cache_stats()
+
+
+@router.get("/pool-stats")
+def get_pool_stats():
+    return pool_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text exposition format
+    lines = REQUEST_METRICS.render()
+    lines.extend(render_stats("libsense_cache", cache_stats()))
+    lines.extend(render_stats("libsense_pool", pool_stats()))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
@@ -1,13 +1,19 @@
 import json
-from datetime import datetime, timedelta
+from datetime import timedelta
 from core.schema import *
-from fastapi import Depends, APIRouter, Query, Request, HTTPException
+from fastapi import Depends, APIRouter, Query, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from core.database import crud
 from core.database.utils import convert_sqlalchemy_objs_to_dict
-from core.utils.dependencies import get_db, validate_auth, validate_privilege
+from core.utils.cache import bump_version, SharedResultCache
+from core.utils.dependencies import (
+    get_db, get_read_db, read_session_factory, pinned_to_primary, validate_auth, validate_privilege
+)
+from core.utils.report import iter_csv, iter_xlsx, iter_gzip
 
 router = APIRouter(prefix="/orders", tags=["Order"], dependencies=[Depends(validate_auth)])
+RESULT_CACHE = SharedResultCache("order_results")
 
 
 def parse_result(result_set):
@@ -72,94 +78,161 @@ def get_pending_rush_local_orders(body: PageableOrderRequest, db: Session):
     return compile_result(result_set, total_records, body)
 
 
+def order_view(views: OrderViews):
+    if views.cdl_view:
+        return "pending_cdl" if views.pending_cdl else "cdl"
+    return "pending_rush_local" if views.pending_rush_local else "all_orders"
+
+
 @router.post("/all-orders", response_model=Union[PageableCDLOrdersSet, PageableOrdersSet])
-def get_all_order(body: PageableOrderRequest, db: Session = Depends(get_db)):
-    if body.views.cdl_view:
-        if body.views.pending_cdl:
-            return get_pending_cdl_orders(body, db)
-        return get_cdl_orders(body, db)
-    if body.views.pending_rush_local:
-        return get_pending_rush_local_orders(body, db)
-    return get_normal_orders(body, db)
+def get_all_order(
+        request: Request, body: PageableOrderRequest, db: Session = Depends(get_read_db)
+):
+    view = order_view(body.views)
+    handlers = {
+        "pending_cdl": get_pending_cdl_orders,
+        "cdl": get_cdl_orders,
+        "pending_rush_local": get_pending_rush_local_orders,
+        "all_orders": get_normal_orders,
+    }
 
+    def build():
+        return handlers[view](body, db).json(by_alias=True)
 
-@router.get("/all-orders/detail", response_model=Union[CDLOrderDetail, OrderDetail])
-def get_order_detail(
-        book_id: int = Query(None, alias="bookId"),
-        cdl_view: bool = Query(False, alias="cdlView"),
-        db: Session = Depends(get_db)
+    try:
+        if pinned_to_primary(request):
+            payload = build()
+        else:
+            payload = RESULT_CACHE.get_or_build(view, body.json(sort_keys=True), build)
+    except LibSenseException as err:
+        raise HTTPException(status_code=422, detail=err.message)
+    return Response(content=payload, media_type="application/json")
+
+
+EXPORT_BUILDERS = {
+    "pending_cdl": crud.get_overdue_cdl,
+    "cdl": crud.get_all_cdl,
+    "pending_rush_local": crud.get_overdue_rush_local,
+    "all_orders": crud.get_all_orders,
+}
+EXPORT_MEDIA_TYPES = {
+    ExportFormats.CSV: "text/csv",
+    ExportFormats.XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+@router.post("/export")
+def export_orders(
+        request: Request,
+        body: PageableOrderRequest,
+        export_format: ExportFormats = Query(ExportFormats.CSV, alias="format"),
 ):
-    if cdl_view:
-        (cdl, order, extra_info, tracking_note) = crud.get_cdl_detail(db, book_id)
+    """
+    Export every row of a view (paging is ignored) with the same filters, fuzzy keyword and sorter.
+    Rows are streamed from a server-side cursor, CSV is gzip-encoded if the client accepts it.
+    """
+    view = order_view(body.views)
+    # the stream outlives the request dependencies, so it owns its session
+    db = read_session_factory(request)()
+    try:
+        params = {**body.__dict__, "page_index": 0, "page_size": -1}
+        statement = EXPORT_BUILDERS[view](db, for_pandas=True, **params)
+    except LibSenseException as err:
+        db.close()
+        raise HTTPException(status_code=422, detail=err.message)
+
+    headers = {
+        "Content-Disposition": 'attachment; filename="%s-%s.%s"' % (
+            view, date.today().strftime("%Y-%m-%d"), export_format.value
+        )
+    }
+    if export_format == ExportFormats.XLSX:
+        blocks = iter_xlsx(db, statement)
     else:
-        (order, extra_info, tracking_note, vendor) = crud.get_order_detail(db, book_id)
-        # vendor could not have been added to system for new orders.
-        if vendor and vendor.notify_in:
-            order.est_arrival = order.created_date + timedelta(days=vendor.notify_in)
+        blocks = iter_csv(db, statement)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            blocks = iter_gzip(blocks)
+            headers["Content-Encoding"] = "gzip"
+
+    def stream():
+        try:
+            yield from blocks
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(), media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers
+    )
+
+
+def compile_detail(order, extra_info, tracking_note, vendor=None, cdl=None):
+    # vendor could not have been added to system for new orders.
+    if vendor and vendor.notify_in:
+        order.est_arrival = order.created_date + timedelta(days=vendor.notify_in)
 
     extra_info.tags = Tags.split_tags(extra_info.tags)
     if extra_info.cdl_flag == 1 and "CDL" not in extra_info.tags:
         extra_info.tags.append("CDL")
 
-    if cdl_view:
+    if cdl is not None:
         return convert_sqlalchemy_objs_to_dict(cdl, order, extra_info, tracking_note)
 
     return convert_sqlalchemy_objs_to_dict(order, extra_info, tracking_note)
 
 
+@router.get("/all-orders/detail", response_model=Union[CDLOrderDetail, OrderDetail])
+def get_order_detail(
+        book_id: int = Query(None, alias="bookId"),
+        cdl_view: bool = Query(False, alias="cdlView"),
+        db: Session = Depends(get_read_db)
+):
+    if cdl_view:
+        (cdl, order, extra_info, tracking_note) = crud.get_cdl_detail(db, book_id)
+        return compile_detail(order, extra_info, tracking_note, cdl=cdl)
+
+    (order, extra_info, tracking_note, vendor) = crud.get_order_detail(db, book_id)
+    return compile_detail(order, extra_info, tracking_note, vendor)
+
+
+@router.post("/all-orders/details", response_model=Dict[int, Union[CDLOrderDetail, OrderDetail]])
+def get_order_details(body: BatchDetailRequest, db: Session = Depends(get_read_db)):
+    # one IN query per table shape; ids missing from the system are left out of the result
+    cdl_flags = {o.book_id: o.cdl for o in body.orders}
+    details = {}
+    normal_ids = [k for k, v in cdl_flags.items() if not v]
+    cdl_ids = [k for k, v in cdl_flags.items() if v]
+    if normal_ids:
+        for (order, extra_info, tracking_note, vendor) in crud.get_order_details(db, normal_ids):
+            if order.id not in details:
+                details[order.id] = compile_detail(order, extra_info, tracking_note, vendor)
+    if cdl_ids:
+        for (cdl, order, extra_info, tracking_note) in crud.get_cdl_details(db, cdl_ids):
+            if order.id not in details:
+                details[order.id] = compile_detail(order, extra_info, tracking_note, cdl=cdl)
+    return details
+
+
 @router.patch("/all-orders/detail", response_model=BasicResponse, dependencies=[Depends(validate_privilege)])
 def update_order(request: Request, body: PatchOrderRequest, db: Session = Depends(get_db)):
     # Full upload. Null is treated as set NULL.
     if body.cdl:
-        (cdl, order, extra_info, tracking_note) = crud.get_cdl_detail(db, body.book_id)
-    else:
-        (order, extra_info, tracking_note, vendor) = crud.get_order_detail(db, body.book_id)
-
-    crud.update_normal_order(db, body)
-    try:
-        if body.sensitive != ("Sensitive" in extra_info.tags):
-            if body.sensitive is True:
-                crud.mark_sensitive(db, body.book_id)
-            elif body.sensitive is False:
-                crud.cancel_sensitive(db, body.book_id)
-
-        if body.check_anyway != extra_info.check_anyway:
-            crud.check_anyway(db, body.book_id, body.check_anyway)
-
-    except LibSenseException as err:
-        raise HTTPException(status_code=500, detail=err.message)
-
-    if body.cdl:
-        if crud.get_cdl_detail(db, body.book_id):
-            crud.update_cdl_order(db, body)
-        else:
+        detail = crud.get_cdl_detail(db, body.book_id)
+        if detail is None:
             raise HTTPException(
                 status_code=500,
                 detail="Incorrect CDL request body. Did you try to update a normal order?"
             )
-    if tracking_note is not None:
-        if tracking_note.tracking_note != body.tracking_note:
-            if body.tracking_note is None:
-                crud.delete_tracking_note(db, body.book_id)
-            else:
-                note = TrackingNote(
-                    book_id=body.book_id,
-                    date=datetime.now(),
-                    taken_by=request.session["username"],
-                    tracking_note=body.tracking_note
-                )
-                crud.update_tracking_note(db, note)
+        (cdl, order, extra_info, tracking_note) = detail
     else:
-        if body.tracking_note is not None:
-            note = TrackingNote(
-                book_id=body.book_id,
-                date=datetime.now(),
-                taken_by=request.session["username"],
-                tracking_note=body.tracking_note
-            )
-            crud.add_tracking_note(db, note)
+        (order, extra_info, tracking_note, vendor) = crud.get_order_detail(db, body.book_id)
+        cdl = None
 
-    return BasicResponse(msg="Success")
+    try:
+        return crud.patch_order(
+            db, body, (order, extra_info, tracking_note, cdl), request.session["username"]
+        )
+    except LibSenseException as err:
+        raise HTTPException(status_code=500, detail=err.message)
 
 
 @router.post("/cdl", tags=["CDL Orders"], response_model=BasicResponse, dependencies=[Depends(validate_privilege)])
@@ -176,20 +249,23 @@ def del_cdl_order(book_id: int = Query(None, alias="bookId"), db: Session = Depe
              tags=["CDL Orders"],
              response_model=BasicResponse,
              dependencies=[Depends(validate_privilege)])
-def reset_cdl_vendor_date(body: UpdateCDLVendorDateRequest):
+def reset_cdl_vendor_date(body: UpdateCDLVendorDateRequest, db: Session = Depends(get_db)):
     with open("configs/config.json") as f:
         config = json.loads(f.read())
     config["cdl_config"]["vendor_start_date"] = str(body.date)
     with open("configs/config.json", "w", encoding="utf-8") as f:
         json.dump(config, f, indent=4)
+    bump_version("data", "cdl")
+    # the start date changes the average turnaround used as CDL due threshold
+    crud.refresh_cdl_due(db)
     return BasicResponse(msg="Success")
 
 
-@router.post("/check")
+@router.post("/check", response_model=BulkUpdateResponse)
 def mark_check(body: CheckedRequest, db: Session = Depends(get_db)):
     return crud.mark_order_checked(db, body.id, body.checked, body.date)
 
 
-@router.post("/attention")
+@router.post("/attention", response_model=BulkUpdateResponse)
 def mark_attention(body: AttentionRequest, db: Session = Depends(get_db)):
     return crud.mark_order_attention(db, body.id, body.attention)
@@ -1,6 +1,7 @@
 import json
 from typing import List
-from core.database import crud, model
+from cachetools import TTLCache
+from core.database import crud, async_crud, model
 from core.schema import (
     BasicResponse,
     Preset,
@@ -12,12 +13,18 @@ from core.schema import (
     OrderViews,
     PresetResponse,
 )
-from core.utils.dependencies import get_db, validate_auth
+from core.utils.cache import InstrumentedCache, get_version
+from core.utils.dependencies import get_db, get_async_db, validate_auth
 from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/preset", tags=["Preset"], dependencies=[Depends(validate_auth)])
 
+# keyed by (username, preset version of the user), crud bumps the version on every preset write
+PRESET_CACHE = InstrumentedCache("presets", TTLCache(maxsize=256, ttl=3600))
+
 
 def preset_to_db(preset, username=None):
     lst = []
@@ -78,13 +85,21 @@ def db_to_preset(presets: List[model.Preset]):
 
 
 @router.get("", response_model=List[Preset])
-async def get_all_presets(request: Request, db: Session = Depends(get_db)):
-    return db_to_preset(crud.get_all_presets(db, request.session["username"]))
+async def get_all_presets(request: Request, db: AsyncSession = Depends(get_async_db)):
+    username = request.session["username"]
+    key = (username, await run_in_threadpool(get_version, "preset:%s" % username))
+    presets = PRESET_CACHE.get(key)
+    if presets is None:
+        presets = db_to_preset(await async_crud.get_all_presets(db, username))
+        PRESET_CACHE.set(key, presets)
+    return presets
 
 
 @router.post("", response_model=PresetResponse)
 async def new_preset(request: Request, preset: PresetRequest, db: Session = Depends(get_db)):
-    preset_id = crud.add_preset(db, preset_to_db(preset, request.session["username"]))
+    preset_id = await run_in_threadpool(
+        crud.add_preset, db, preset_to_db(preset), request.session["username"]
+    )
     return PresetResponse(msg="Success", preset_id=preset_id)
 
 
@@ -92,8 +107,8 @@ async def new_preset(request: Request, preset: PresetRequest, db: Session = Depe
 async def update_preset(
     request: Request, preset: UpdatePresetRequest, db: Session = Depends(get_db)
 ):
-    preset_id = crud.update_preset(
-        db, preset_to_db(preset), preset.preset_id, request.session["username"]
+    preset_id = await run_in_threadpool(
+        crud.update_preset, db, preset_to_db(preset), preset.preset_id, request.session["username"]
     )
     if preset_id == -1:
         raise (HTTPException(status_code=500, detail="Error when updating preset"))
@@ -104,7 +119,7 @@ async def update_preset(
 async def delete_preset(
     request: Request, preset_id: int = Query(None, alias="presetId"), db: Session = Depends(get_db)
 ):
-    result = crud.delete_preset(db, preset_id, request.session["username"])
+    result = await run_in_threadpool(crud.delete_preset, db, preset_id, request.session["username"])
     if result == -1:
         raise HTTPException(status_code=500,
                 detail="Error when deleting preset. User can only delete preset that he/she created.")
@@ -1,52 +1,52 @@
 import os
-import glob
-import pandas as pd
-from fastapi import APIRouter, Depends, Body
-from sqlalchemy.orm import Session
+import shutil
+import tempfile
+from fastapi import APIRouter, Depends, Body, HTTPException, Query, Request
+from fastapi.responses import FileResponse
 from core.schema import *
-from core.gsuite.tools import LibSenseGSuite
-from core.database import crud
-from core.utils.dependencies import get_db, validate_auth
+from core.utils.delivery import DELIVERY_QUEUE, queue_report
+from core.utils.dependencies import read_session_factory, validate_auth
+from core.utils.report import get_artifact, get_reports
 
 router = APIRouter(prefix="/report", tags=["Report"], dependencies=[Depends(validate_auth)])
 
 
-@router.post("/send-report", response_model=BasicResponse)
-def send_report(payload: SendReportRequest, db: Session = Depends(get_db)):
-    service = LibSenseGSuite()
-    service.initialize_mail()
-    today = date.today().strftime("%Y-%m-%d")
-    attachments = {}
-    count = {}
-    for rt in payload.report_type:
-        if rt == "RushLocal":
-            query = crud.get_overdue_rush_local(db, 0, -1, for_pandas=True)
-            df = pd.read_sql(query, db.get_bind())
-            file_path = "temp/Report-%s-%s.csv" % (rt, today)
-            count[rt] = df.shape[0]
-            df.to_csv(file_path, index=False)
-            attachments[rt] = file_path
-        elif rt == "CDLOrder":
-            query = crud.get_overdue_cdl(db, 0, -1, for_pandas=True)
-            df = pd.read_sql(query, db.get_bind())
-            file_path = "temp/Report-%s-%s.csv" % (rt, today)
-            count[rt] = df.shape[0]
-            df.to_csv(file_path, index=False)
-            attachments[rt] = file_path
-        elif rt == "ShanghaiOrder":
-            query = crud.get_sh_order_report(db, 0, -1, for_pandas=True)
-            df = pd.read_sql(query, db.get_bind())
-            file_path = "temp/Report-%s-%s.csv" % (rt, today)
-            count[rt] = df.shape[0]
-            df.to_csv(file_path, index=False)
-            attachments[rt] = file_path
-
-    if os.getenv("LIBSENSE_ENV", "Prod") == "Prod":
-        service.send_message(payload.email, payload.username, count, attachments)
-
-        files = glob.glob("temp/*")
-        for f in files:
-            os.remove(f)
-    
-    return {"msg": "Successfully sent report."}
+@router.post("/send-report", response_model=JobResponse)
+def send_report(request: Request, payload: SendReportRequest):
+    # each request gets its own temp dir, removed by the delivery job once the report is sent
+    os.makedirs("temp", exist_ok=True)
+    directory = tempfile.mkdtemp(dir="temp")
+    try:
+        # served from the latest pre-generated artifacts of the day
+        count, attachments, generated_at = get_reports(
+            read_session_factory(request), payload.report_type, directory
+        )
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    job_id = queue_report(payload.email, payload.username, count, attachments, directory)
+    return JobResponse(
+        msg="Report generated at %s queued for delivery." % min(generated_at.values(), default="-"),
+        job_id=job_id,
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+def get_report_job(job_id: str):
+    job = DELIVERY_QUEUE.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("/download")
+def download_report(request: Request, report_type: ReportTypes = Query(..., alias="reportType")):
+    sidecar = get_artifact(read_session_factory(request), report_type.value)
+    return FileResponse(
+        sidecar["path"],
+        media_type="text/csv",
+        filename="Report-%s-%s.csv" % (report_type.value, date.today().strftime("%Y-%m-%d")),
+        headers={"Content-Encoding": "gzip", "X-Report-Generated-At": sidecar["generated_at"]},
+    )
     
\ No newline at end of file
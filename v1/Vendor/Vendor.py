@@ -1,36 +1,44 @@
 from core.schema import Vendor, BasicResponse
 from typing import List
 from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from core.database import crud
-from core.utils.dependencies import get_db, validate_auth, validate_privilege
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import crud, async_crud
+from core.utils.dependencies import get_db, get_async_db, validate_auth, validate_privilege
 
 router = APIRouter(prefix="/vendor", tags=["Vendor"], dependencies=[Depends(validate_auth)])
 
 
 @router.get("/all-vendors", response_model=List[Vendor])
-async def get_all_vendors(db: Session = Depends(get_db)):
-    return crud.get_all_vendors(db)
+async def get_all_vendors(db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_all_vendors(db)
 
 
 @router.get("", response_model=Vendor)
 async def get_vendor(
         vendor_code: str = Query(None, alias="vendorCode"),
-        db: Session = Depends(get_db)):
-    return crud.get_vendor(db, vendor_code)
+        db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_vendor(db, vendor_code)
 
 
 @router.post("", response_model=Vendor, dependencies=[Depends(validate_privilege)])
 async def new_vendor(vendor: Vendor, db: Session = Depends(get_db)):
-    return await crud.add_vendor(db, vendor)
+    result = await run_in_threadpool(crud.add_vendor, db, vendor)
+    await run_in_threadpool(crud.rebuild_metadata_snapshot, db)
+    return result
 
 
 @router.patch("", response_model=BasicResponse, dependencies=[Depends(validate_privilege)])
 async def update_vendor(vendor: Vendor, db: Session = Depends(get_db)):
-    return await crud.update_vendor(db, vendor)
+    result = await run_in_threadpool(crud.update_vendor, db, vendor)
+    await run_in_threadpool(crud.rebuild_metadata_snapshot, db)
+    return result
 
 
 @router.delete("", response_model=BasicResponse, dependencies=[Depends(validate_privilege)])
 async def delete_vendor(
         vendor_code: str = Query(None, alias="vendorCode"), db: Session = Depends(get_db)):
-    return await crud.delete_vendor(db, vendor_code)
+    result = await run_in_threadpool(crud.delete_vendor, db, vendor_code)
+    await run_in_threadpool(crud.rebuild_metadata_snapshot, db)
+    return result
@@ -5,15 +5,18 @@ from .Vendor import Vendor
 from .Report import Report
 from .Preset import Preset
 from.Internal import Internal
-from fastapi import Body, APIRouter, Depends, HTTPException
+from cachetools import TTLCache
+from fastapi import Body, APIRouter, Depends, HTTPException, Request
 from core import schema
-from core.utils.dependencies import validate_auth
+from core.utils.cache import InstrumentedCache
+from core.utils.dependencies import validate_auth, get_read_db, pinned_to_primary
 from sqlalchemy.orm import Session
-from core.database.database import SessionLocal
 from core.database import crud
 
 
 router = APIRouter(prefix='/v1')
+# keyed by data version; pending counts also move with the clock, hence the short TTL
+OVERVIEW_CACHE = InstrumentedCache("overview", TTLCache(maxsize=4, ttl=60))
 router.include_router(Auth.router)
 router.include_router(Data.router)
 router.include_router(Order.router)
@@ -23,14 +26,6 @@ router.include_router(Preset.router)
 router.include_router(Internal.router)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post("/test", summary="Test API", tags=["Test"])
 def get_root(body: dict = Body(...)):
     if body.get("error", False):
@@ -43,27 +38,12 @@ def get_root(body: dict = Body(...)):
 
 
 @router.get("/overview", tags=["Data"], dependencies=[Depends(validate_auth)], response_model=schema.Overview)
-def get_overview(db: Session = Depends(get_db)):
-    local_rush_pending = crud.get_local_rush_pending(db)[0]
-    cdl_pending = crud.get_cdl_pending(db)[0]
-    cdl_rs, rush_nyr_rs, rush_local_rs, cdl_scan_rs = crud.get_average_days(db)
-    return schema.Overview(
-        local_rush_pending=local_rush_pending,
-        cdl_pending=cdl_pending,
-
-        avg_cdl=cdl_rs["avg"] or 0,
-        avg_rush_nyc=rush_nyr_rs["avg"],
-        avg_rush_local=rush_local_rs["avg"],
-
-        min_cdl=cdl_rs["min"] or 0,
-        min_rush_nyc=rush_nyr_rs["min"],
-        min_rush_local=rush_local_rs["min"],
+def get_overview(request: Request, db: Session = Depends(get_read_db)):
+    if pinned_to_primary(request):
+        return build_overview(db)
+    return OVERVIEW_CACHE.get_or_build_versioned(("data", "cdl"), lambda: build_overview(db))
 
-        max_cdl=cdl_rs["max"] or 0,
-        max_rush_nyc=rush_nyr_rs["max"],
-        max_rush_local=rush_local_rs["max"],
 
-        avg_cdl_scan=cdl_scan_rs["avg"] or 0,
-        max_cdl_scan=cdl_scan_rs["max"] or 0,
-        min_cdl_scan=cdl_scan_rs["min"] or 0,
-    )
+def build_overview(db: Session):
+    stats = crud.get_overview_stats(db)
+    return schema.Overview(**{k: v or 0 for k, v in stats._mapping.items()})